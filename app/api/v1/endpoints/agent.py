@@ -6,6 +6,7 @@ from fastapi.encoders import jsonable_encoder
 from fastapi.responses import JSONResponse
 from loguru import logger
 from sqlalchemy.orm import Session
+from starlette.concurrency import run_in_threadpool
 from typing import List
 
 from app.core.dependencies import get_db_session
@@ -79,7 +80,8 @@ async def interactive_chat(messages: List[Message], db: Session = Depends(get_db
         elif intent == "search_cars":
             search_criteria = last_message.parts
             logger.debug(f"Search criteria: {search_criteria}")
-            response_data = handle_search_cars(db, search_criteria)
+            # The search cache may wait on another worker's refresh, so keep it off the event loop
+            response_data = await run_in_threadpool(handle_search_cars, db, search_criteria)
         else:
             logger.warning(f"Unknown intent: {intent}")
             response_data = {"message": "Unknown intent"}
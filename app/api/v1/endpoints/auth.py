@@ -5,10 +5,11 @@ from fastapi import Depends
 from fastapi.security import OAuth2PasswordBearer, OAuth2PasswordRequestForm
 from loguru import logger
 from sqlalchemy.orm import Session
+from starlette.concurrency import run_in_threadpool
 
 from app.core.app_config import settings
 from app.core.dependencies import get_db_session, get_current_user
-from app.core.security import create_access_token, get_password_hash
+from app.core.security import create_access_token, get_password_hash_async, verify_and_update_password_async
 from app.crud import crud_user
 from app.db.session import get_db
 from app.models.user import User
@@ -29,7 +30,7 @@ async def register(user: UserCreate, db: Session = Depends(get_db_session)):
         raise HTTPException(status_code=400, detail="Email already registered")
 
     try:
-        hashed_password = get_password_hash(user.password)
+        hashed_password = await get_password_hash_async(user.password)
         db_user = User(
             username=user.username,
             email=user.email,
@@ -50,16 +51,23 @@ async def register(user: UserCreate, db: Session = Depends(get_db_session)):
 
 
 @router.post("/login", response_model=Token)
-def login_for_access_token(form_data: OAuth2PasswordRequestForm = Depends(), db: Session = Depends(get_db)):
+async def login_for_access_token(form_data: OAuth2PasswordRequestForm = Depends(), db: Session = Depends(get_db)):
     logger.info(f"Attempting to log in user with email: {form_data.username}")
-    user = crud_user.get_user_by_email(db, email=form_data.username)
-    if not user or not crud_user.verify_user_password(user, form_data.password):
+    # The handler is async so bcrypt can run on its own bounded pool; the DB calls go to the threadpool
+    user = await run_in_threadpool(crud_user.get_user_by_email, db, email=form_data.username)
+    valid, new_hash = (await verify_and_update_password_async(form_data.password, user.hashed_password)
+                       if user else (False, None))
+    if not valid:
         logger.warning(f"Login failed: Incorrect username or password for email: {form_data.username}")
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="Incorrect username or password",
             headers={"WWW-Authenticate": "Bearer"},
         )
+    if new_hash:
+        # Stored with an older work factor: upgrade while the plain password is at hand
+        await run_in_threadpool(crud_user.update_password_hash, db, user, new_hash)
+        logger.info(f"Password hash upgraded for email: {form_data.username}")
     try:
         access_token_expires = timedelta(minutes=settings.ACCESS_TOKEN_EXPIRE_MINUTES)
         access_token = create_access_token(data={"sub": user.email}, expires_delta=access_token_expires)
@@ -1,33 +1,157 @@
-from fastapi import APIRouter, Depends, HTTPException
+from datetime import datetime, timedelta
+from typing import List, Optional
+
+from fastapi import APIRouter, BackgroundTasks, Depends, Header, HTTPException, Query, Response
+from fastapi.responses import StreamingResponse
 from loguru import logger
 from sqlalchemy.orm import Session
 
-from app.core.dependencies import get_db_session, get_current_active_user
-from app.crud import crud_booking
-from app.schemas.booking import BookingCreate, BookingInDB, BookingUpdate
+from app.core.app_settings import settings
+from app.core.dependencies import get_db_session, get_current_active_user, get_current_active_admin
+from app.crud import crud_booking, crud_hold
+from app.db.session import SessionLocal
+from app.schemas.booking import BookingCreate, BookingInDB, BookingUpdate, BookingBulkCreate, BookingBulkResult, \
+    BookingHoldCreate, BookingHold
+from app.schemas.user import UserInDB
+from app.services import qr_service
+from app.utils.pagination import get_cursor, next_cursor, NEXT_CURSOR_HEADER
+from app.utils.streaming import encode_rows, ExportFormat, MEDIA_TYPES
 
 router = APIRouter()
 
+QR_CACHE_MAX_AGE = 3600
+
 
-@router.post("/", response_model=BookingInDB, dependencies=[Depends(get_current_active_user)])
-async def create_booking(booking: BookingCreate, db: Session = Depends(get_db_session)):
+@router.post("/", response_model=BookingInDB)
+async def create_booking(booking: BookingCreate, background_tasks: BackgroundTasks,
+                         db: Session = Depends(get_db_session),
+                         current_user: UserInDB = Depends(get_current_active_user)):
     try:
         if booking.start_time >= booking.end_time:
             logger.warning("Invalid booking times: start_time must be before end_time")
             raise HTTPException(status_code=400, detail="Invalid booking times: start_time must be before end_time")
 
         # Create the booking
-        new_booking = crud_booking.create_booking(db=db, booking=booking)
+        new_booking = crud_booking.create_booking(db=db, booking=booking, user_id=current_user.id)
+        background_tasks.add_task(qr_service.prerender_booking_qr, new_booking.id, qr_service.booking_qr_data(new_booking))
         logger.info(f"Booking created: {new_booking.id}")
         return new_booking
     except HTTPException as e:
         logger.error(f"HTTP error creating booking: {e.detail}")
         raise
+    except (crud_booking.BookingConflictError, crud_hold.InvalidHoldError) as e:
+        logger.warning(f"Booking conflict: {e}")
+        raise HTTPException(status_code=409, detail=str(e))
     except Exception as e:
         logger.error(f"Unexpected error creating booking: {e}")
         raise HTTPException(status_code=500, detail="Internal Server Error")
 
 
+@router.post("/holds", response_model=BookingHold)
+async def hold_booking(hold: BookingHoldCreate, db: Session = Depends(get_db_session),
+                       current_user: UserInDB = Depends(get_current_active_user)):
+    if hold.start_time >= hold.end_time:
+        raise HTTPException(status_code=400, detail="Invalid hold times: start_time must be before end_time")
+    try:
+        new_hold = crud_booking.hold_booking(db=db, hold=hold, user_id=current_user.id)
+        logger.info(f"Hold placed: {new_hold['id']}")
+        return crud_hold.describe_hold(new_hold)
+    except crud_booking.BookingConflictError as e:
+        logger.warning(f"Hold conflict: {e}")
+        raise HTTPException(status_code=409, detail=str(e))
+    except Exception as e:
+        logger.error(f"Unexpected error placing hold: {e}")
+        raise HTTPException(status_code=500, detail="Internal Server Error")
+
+
+@router.delete("/holds/{hold_id}", response_model=BookingHold)
+async def release_hold(hold_id: str, current_user: UserInDB = Depends(get_current_active_user)):
+    hold = crud_hold.get_hold(hold_id)
+    if hold is None or (hold["user_id"] != current_user.id and current_user.role != "admin"):
+        logger.warning(f"Hold not found: {hold_id}")
+        raise HTTPException(status_code=404, detail="Hold not found")
+    try:
+        crud_hold.release_hold(hold)
+        logger.info(f"Hold released: {hold_id}")
+        return crud_hold.describe_hold(hold)
+    except Exception as e:
+        logger.error(f"Error releasing hold: {e}")
+        raise HTTPException(status_code=500, detail="Internal Server Error")
+
+
+@router.post("/bulk", response_model=BookingBulkResult)
+async def create_bookings(request: BookingBulkCreate, background_tasks: BackgroundTasks,
+                          db: Session = Depends(get_db_session),
+                          current_user: UserInDB = Depends(get_current_active_user)):
+    try:
+        items = crud_booking.create_bookings(db=db, bookings=request.bookings, user_id=current_user.id)
+        created = [item["booking"] for item in items if item["status"] == "created"]
+        if created:
+            background_tasks.add_task(qr_service.prerender_booking_qrs,
+                                      [qr_service.booking_qr_data(booking) for booking in created])
+        logger.info(f"Bulk booking: {len(created)} of {len(items)} bookings created")
+        return {"created": len(created), "items": items}
+    except crud_booking.BookingConflictError as e:
+        logger.warning(f"Bulk booking conflict: {e}")
+        raise HTTPException(status_code=409, detail=str(e))
+    except Exception as e:
+        logger.error(f"Unexpected error creating bookings: {e}")
+        raise HTTPException(status_code=500, detail="Internal Server Error")
+
+
+@router.get("/", response_model=List[BookingInDB], dependencies=[Depends(get_current_active_admin)])
+async def read_bookings(response: Response, skip: int = 0, limit: int = 10,
+                        after_id: Optional[int] = Depends(get_cursor), db: Session = Depends(get_db_session)):
+    try:
+        bookings = crud_booking.get_bookings(db=db, skip=skip, limit=limit, after_id=after_id)
+        cursor = next_cursor(bookings, limit)
+        if cursor:
+            response.headers[NEXT_CURSOR_HEADER] = cursor
+        logger.info(f"Retrieved {len(bookings)} bookings")
+        return bookings
+    except Exception as e:
+        logger.error(f"Error retrieving bookings: {e}")
+        raise HTTPException(status_code=500, detail="Internal Server Error")
+
+
+@router.get("/export", dependencies=[Depends(get_current_active_admin)])
+def export_bookings(fmt: ExportFormat = Query("csv", alias="format", description="Export format"),
+                    start: Optional[datetime] = Query(None, description="Only bookings starting at or after this time"),
+                    end: Optional[datetime] = Query(None, description="Only bookings starting before this time"),
+                    car_id: Optional[int] = Query(None, description="Only bookings of this car"),
+                    user_id: Optional[int] = Query(None, description="Only bookings of this user")):
+    if start is not None and end is not None and start >= end:
+        raise HTTPException(status_code=400, detail="Invalid export range: start must be before end")
+
+    def generate():
+        # The request's session is closed before the body streams, so the export owns its own
+        db = SessionLocal()
+        try:
+            rows = crud_booking.stream_bookings(db, start=start, end=end, car_id=car_id, user_id=user_id)
+            yield from encode_rows(rows, crud_booking.EXPORT_COLUMNS, fmt)
+        finally:
+            db.close()
+
+    logger.info(f"Exporting bookings as {fmt}")
+    return StreamingResponse(generate(), media_type=MEDIA_TYPES[fmt],
+                             headers={"Content-Disposition": f"attachment; filename=bookings.{fmt}"})
+
+
+@router.post("/archive", dependencies=[Depends(get_current_active_admin)])
+def archive_bookings(before: Optional[datetime] = Query(None, description="Archive bookings that ended before this "
+                                                                          "time (default: BOOKING_ARCHIVE_AFTER_DAYS ago)"),
+                     db: Session = Depends(get_db_session)):
+    # Plain def: the move can take a while and runs in the threadpool instead of on the event loop
+    cutoff = before or datetime.utcnow() - timedelta(days=settings.BOOKING_ARCHIVE_AFTER_DAYS)
+    try:
+        archived = crud_booking.archive_bookings(db=db, cutoff=cutoff)
+        logger.info(f"Archived {archived} bookings that ended before {cutoff}")
+        return {"archived": archived, "before": cutoff}
+    except Exception as e:
+        logger.error(f"Error archiving bookings: {e}")
+        raise HTTPException(status_code=500, detail="Internal Server Error")
+
+
 @router.get("/{booking_id}", response_model=BookingInDB, dependencies=[Depends(get_current_active_user)])
 async def read_booking(booking_id: int, db: Session = Depends(get_db_session)):
     try:
@@ -42,15 +166,44 @@ async def read_booking(booking_id: int, db: Session = Depends(get_db_session)):
         raise HTTPException(status_code=500, detail="Internal Server Error")
 
 
+@router.get("/{booking_id}/qr", response_class=Response, dependencies=[Depends(get_current_active_user)],
+            responses={200: {"content": {"image/png": {}}}, 304: {"description": "Not modified"}})
+async def read_booking_qr(booking_id: int, if_none_match: Optional[str] = Header(None),
+                          db: Session = Depends(get_db_session)):
+    booking = crud_booking.get_booking(db=db, booking_id=booking_id)
+    if booking is None:
+        logger.warning(f"Booking not found: {booking_id}")
+        raise HTTPException(status_code=404, detail="Booking not found")
+    try:
+        qr_data = qr_service.booking_qr_data(booking)
+        etag = f'"{qr_service.qr_digest(qr_data)}"'
+        headers = {"ETag": etag, "Cache-Control": f"private, max-age={QR_CACHE_MAX_AGE}"}
+        if if_none_match and (if_none_match.strip() == "*" or
+                              etag in (tag.strip().removeprefix("W/") for tag in if_none_match.split(","))):
+            return Response(status_code=304, headers=headers)
+        qr_code = await qr_service.get_qr_png(qr_data)
+        logger.info(f"QR code served for booking: {booking_id}")
+        return Response(content=qr_code, media_type="image/png", headers=headers)
+    except Exception as e:
+        logger.error(f"Error serving QR code: {e}")
+        raise HTTPException(status_code=500, detail="Internal Server Error")
+
+
 @router.put("/{booking_id}", response_model=BookingInDB, dependencies=[Depends(get_current_active_user)])
-async def update_booking(booking_id: int, booking: BookingUpdate, db: Session = Depends(get_db_session)):
+async def update_booking(booking_id: int, booking: BookingUpdate, background_tasks: BackgroundTasks,
+                         db: Session = Depends(get_db_session)):
     try:
         updated_booking = crud_booking.update_booking(db=db, booking_id=booking_id, booking=booking)
         if updated_booking is None:
             logger.warning(f"Booking not found: {booking_id}")
             raise HTTPException(status_code=404, detail="Booking not found")
+        background_tasks.add_task(qr_service.prerender_booking_qr, updated_booking.id,
+                                  qr_service.booking_qr_data(updated_booking))
         logger.info(f"Booking updated: {updated_booking.id}")
         return updated_booking
+    except crud_booking.BookingConflictError as e:
+        logger.warning(f"Booking conflict: {e}")
+        raise HTTPException(status_code=409, detail=str(e))
     except Exception as e:
         logger.error(f"Error updating booking: {e}")
         raise HTTPException(status_code=500, detail="Internal Server Error")
@@ -1,20 +1,30 @@
+import csv
+from datetime import date, datetime
 from typing import List, Optional
 
-from fastapi import APIRouter, Depends, HTTPException, Query
+from fastapi import APIRouter, Depends, HTTPException, Query, Response, UploadFile, File
+from fastapi.responses import StreamingResponse
 from loguru import logger
 from sqlalchemy.orm import Session
 
 from app.core.dependencies import get_db_session, get_current_active_user, get_current_active_admin
-from app.crud import crud_car
-from app.schemas.car import CarCreate, CarInDB, CarUpdate
+from app.crud import crud_car, crud_occupancy
+from app.db.session import SessionLocal
+from app.schemas.car import CarCreate, CarInDB, CarUpdate, CarFacets, CarOccupancy, VehicleType
+from app.utils.geo import parse_point
+from app.utils.pagination import get_cursor, next_cursor, NEXT_CURSOR_HEADER
+from app.utils.streaming import iter_records, encode_rows, ExportFormat, MEDIA_TYPES
 
 router = APIRouter()
 
+MAX_CALENDAR_CARS = 100
+MAX_CALENDAR_DAYS = 366
+
 
 @router.post("/", response_model=CarInDB, dependencies=[Depends(get_current_active_admin)])
 async def create_car(car: CarCreate, db: Session = Depends(get_db_session)):
     try:
-        new_car = crud_car.create_car(db=db, car=car)
+        new_car = await crud_car.create_car_async(db=db, car=car)
         logger.info(f"Car created: {new_car.id}")
         return new_car
     except Exception as e:
@@ -22,10 +32,97 @@ async def create_car(car: CarCreate, db: Session = Depends(get_db_session)):
         raise HTTPException(status_code=500, detail="Internal Server Error")
 
 
+@router.post("/import", dependencies=[Depends(get_current_active_admin)])
+def import_cars(file: UploadFile = File(..., description="CSV with a header row, or NDJSON"),
+                fmt: ExportFormat = Query("csv", alias="format", description="Upload format"),
+                db: Session = Depends(get_db_session)):
+    # Plain def: parsing and batched inserts run in the threadpool instead of on the event loop
+    try:
+        result = crud_car.bulk_create_cars(db=db, records=iter_records(file.file, fmt))
+        logger.info(f"Imported {result['imported']} cars with {len(result['errors'])} rejected rows")
+        return result
+    except (ValueError, csv.Error) as e:
+        logger.warning(f"Malformed car import: {e}")
+        raise HTTPException(status_code=400, detail=f"Malformed {fmt} upload")
+    except Exception as e:
+        logger.error(f"Error importing cars: {e}")
+        raise HTTPException(status_code=500, detail="Internal Server Error")
+
+
+@router.get("/export", dependencies=[Depends(get_current_active_admin)])
+def export_cars(fmt: ExportFormat = Query("csv", alias="format", description="Export format")):
+    def generate():
+        # The request's session is closed before the body streams, so the export owns its own
+        db = SessionLocal()
+        try:
+            yield from encode_rows(crud_car.stream_cars(db), crud_car.EXPORT_COLUMNS, fmt)
+        finally:
+            db.close()
+
+    logger.info(f"Exporting cars as {fmt}")
+    return StreamingResponse(generate(), media_type=MEDIA_TYPES[fmt],
+                             headers={"Content-Disposition": f"attachment; filename=cars.{fmt}"})
+
+
+@router.get("/facets", response_model=CarFacets, dependencies=[Depends(get_current_active_user)])
+async def car_facets(
+        db: Session = Depends(get_db_session),
+        model: Optional[str] = Query(None, description="Filter by car model"),
+        available: Optional[bool] = Query(None, description="Filter by availability"),
+        min_price: Optional[float] = Query(None, description="Filter by minimum price"),
+        max_price: Optional[float] = Query(None, description="Filter by maximum price"),
+        vehicle_type: Optional[VehicleType] = Query(None, description="Filter by vehicle type"),
+        location: Optional[str] = Query(None, description="Filter by location"),
+        start_time: Optional[datetime] = Query(None, description="Only cars free from this time"),
+        end_time: Optional[datetime] = Query(None, description="Only cars free until this time"),
+):
+    if (start_time is None) != (end_time is None):
+        raise HTTPException(status_code=400, detail="start_time and end_time must be provided together")
+    try:
+        search_criteria = {
+            "model": model,
+            "available": available,
+            "min_price": min_price,
+            "max_price": max_price,
+            "vehicle_type": vehicle_type,
+            "location": location,
+            "start_time": start_time,
+            "end_time": end_time
+        }
+        facets = await crud_car.get_car_facets_async(db=db, search_criteria=search_criteria)
+        logger.info(f"Computed facets for {facets['total']} cars")
+        return facets
+    except Exception as e:
+        logger.error(f"Error computing car facets: {e}")
+        raise HTTPException(status_code=500, detail="Internal Server Error")
+
+
+@router.get("/calendar", response_model=List[CarOccupancy], dependencies=[Depends(get_current_active_user)])
+async def car_calendar(
+        db: Session = Depends(get_db_session),
+        car_ids: List[int] = Query(..., description="Cars to return the calendar for"),
+        start: date = Query(..., description="First day of the calendar"),
+        end: date = Query(..., description="Last day of the calendar (inclusive)"),
+):
+    car_ids = list(dict.fromkeys(car_ids))
+    if len(car_ids) > MAX_CALENDAR_CARS:
+        raise HTTPException(status_code=400, detail=f"At most {MAX_CALENDAR_CARS} cars per calendar request")
+    if start > end or (end - start).days >= MAX_CALENDAR_DAYS:
+        raise HTTPException(status_code=400, detail=f"Invalid range: start must not be after end and the range "
+                                                    f"may span at most {MAX_CALENDAR_DAYS} days")
+    try:
+        calendar = await crud_occupancy.get_occupancy_async(db=db, car_ids=car_ids, start=start, end=end)
+        logger.info(f"Calendar retrieved for {len(car_ids)} cars from {start} to {end}")
+        return [{"car_id": car_id, "booked_days": days} for car_id, days in calendar.items()]
+    except Exception as e:
+        logger.error(f"Error retrieving car calendar: {e}")
+        raise HTTPException(status_code=500, detail="Internal Server Error")
+
+
 @router.get("/{car_id}", response_model=CarInDB, dependencies=[Depends(get_current_active_user)])
 async def read_car(car_id: int, db: Session = Depends(get_db_session)):
     try:
-        car = crud_car.get_car(db=db, car_id=car_id)
+        car = await crud_car.get_car_async(db=db, car_id=car_id)
         if car is None:
             logger.warning(f"Car not found: {car_id}")
             raise HTTPException(status_code=404, detail="Car not found")
@@ -39,7 +136,7 @@ async def read_car(car_id: int, db: Session = Depends(get_db_session)):
 @router.put("/{car_id}", response_model=CarInDB, dependencies=[Depends(get_current_active_admin)])
 async def update_car(car_id: int, car: CarUpdate, db: Session = Depends(get_db_session)):
     try:
-        updated_car = crud_car.update_car(db=db, car_id=car_id, car=car)
+        updated_car = await crud_car.update_car_async(db=db, car_id=car_id, car=car)
         if updated_car is None:
             logger.warning(f"Car not found: {car_id}")
             raise HTTPException(status_code=404, detail="Car not found")
@@ -53,7 +150,7 @@ async def update_car(car_id: int, car: CarUpdate, db: Session = Depends(get_db_s
 @router.delete("/{car_id}", response_model=CarInDB, dependencies=[Depends(get_current_active_admin)])
 async def delete_car(car_id: int, db: Session = Depends(get_db_session)):
     try:
-        deleted_car = crud_car.delete_car(db=db, car_id=car_id)
+        deleted_car = await crud_car.delete_car_async(db=db, car_id=car_id)
         if deleted_car is None:
             logger.warning(f"Car not found: {car_id}")
             raise HTTPException(status_code=404, detail="Car not found")
@@ -66,17 +163,38 @@ async def delete_car(car_id: int, db: Session = Depends(get_db_session)):
 
 @router.get("/", response_model=List[CarInDB], dependencies=[Depends(get_current_active_user)])
 async def search_cars(
+        response: Response,
         db: Session = Depends(get_db_session),
         model: Optional[str] = Query(None, description="Filter by car model"),
         available: Optional[bool] = Query(None, description="Filter by availability"),
         min_price: Optional[float] = Query(None, description="Filter by minimum price"),
         max_price: Optional[float] = Query(None, description="Filter by maximum price"),
-        vehicle_type: Optional[str] = Query(None, description="Filter by vehicle type"),
+        vehicle_type: Optional[VehicleType] = Query(None, description="Filter by vehicle type"),
         location: Optional[str] = Query(None, description="Filter by location"),
         daily_rate: Optional[float] = Query(None, description="Filter by daily rate"),
+        start_time: Optional[datetime] = Query(None, description="Only cars free from this time"),
+        end_time: Optional[datetime] = Query(None, description="Only cars free until this time"),
+        near: Optional[str] = Query(None, description="Sort by distance from this point, as 'lat,lon'"),
+        radius: float = Query(10, gt=0, le=1000, description="Search radius in km around `near`"),
         skip: int = Query(0, description="Number of records to skip for pagination"),
-        limit: int = Query(10, description="Maximum number of records to return")
+        limit: int = Query(10, description="Maximum number of records to return"),
+        after_id: Optional[int] = Depends(get_cursor)
 ):
+    if (start_time is None) != (end_time is None):
+        raise HTTPException(status_code=400, detail="start_time and end_time must be provided together")
+    if start_time is not None and start_time >= end_time:
+        raise HTTPException(status_code=400, detail="Invalid search times: start_time must be before end_time")
+    point = None
+    if near is not None:
+        try:
+            point = parse_point(near)
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=str(e))
+        if after_id is not None:
+            raise HTTPException(status_code=400, detail="Distance searches page with skip, not a cursor")
+        if skip + limit > crud_car.MAX_NEAR_RESULTS:
+            raise HTTPException(status_code=400,
+                                detail=f"Distance searches return at most the {crud_car.MAX_NEAR_RESULTS} nearest cars")
     try:
         search_criteria = {
             "model": model,
@@ -85,9 +203,18 @@ async def search_cars(
             "max_price": max_price,
             "vehicle_type": vehicle_type,
             "location": location,
-            "daily_rate": daily_rate
+            "daily_rate": daily_rate,
+            "start_time": start_time,
+            "end_time": end_time,
+            "near": point,
+            "radius": radius if point else None
         }
-        cars = crud_car.search_cars(db=db, search_criteria=search_criteria, skip=skip, limit=limit)
+        cars = await crud_car.search_cars_async(db=db, search_criteria=search_criteria, skip=skip, limit=limit,
+                                                after_id=after_id)
+        # Text and distance searches are ranked, which an id cursor can't resume, so they page with skip
+        cursor = next_cursor(cars, limit) if not (model or location or point) else None
+        if cursor:
+            response.headers[NEXT_CURSOR_HEADER] = cursor
         logger.info(f"Found {len(cars)} cars matching the search criteria")
         return cars
     except Exception as e:
@@ -1,23 +1,43 @@
-from fastapi import APIRouter, Depends, HTTPException
+from datetime import datetime
+from typing import List, Optional
+
+from fastapi import APIRouter, Depends, HTTPException, Query
 from loguru import logger
 from sqlalchemy.orm import Session
 
 from app.core.dependencies import get_db_session, get_current_active_user, get_current_active_admin
-from app.crud import crud_pricing
-from app.schemas.pricing import PricingResponse, PricingCreate, PricingUpdate
+from app.crud import crud_pricing, crud_price_history
+from app.schemas.pricing import PricingResponse, PricingCreate, PricingUpdate, Quote, PricePoint, \
+    PricingBulkUpdate
 
 router = APIRouter()
 
+MAX_QUOTE_CARS = 100
+
 
 @router.get("/pricing", response_model=PricingResponse, dependencies=[Depends(get_current_active_user)])
 async def get_pricing(car_id: int, db: Session = Depends(get_db_session)):
     try:
-        pricing = crud_pricing.get_car_pricing(db=db, car_id=car_id)
-        if not pricing:
-            logger.warning(f"Car not found: {car_id}")
-            raise HTTPException(status_code=404, detail="Car not found")
-        logger.info(f"Pricing retrieved for car: {car_id}")
-        return pricing
+        pricing = await crud_pricing.get_car_pricing_async(db=db, car_id=car_id)
+    except Exception as e:
+        logger.error(f"Error retrieving pricing: {e}")
+        raise HTTPException(status_code=500, detail="Internal Server Error")
+    if not pricing:
+        logger.warning(f"Car not found: {car_id}")
+        raise HTTPException(status_code=404, detail="Car not found")
+    logger.info(f"Pricing retrieved for car: {car_id}")
+    return pricing
+
+
+@router.get("/pricing/prices", response_model=List[PricingResponse], dependencies=[Depends(get_current_active_user)])
+async def get_prices(car_ids: List[int] = Query(..., description="Cars to price"),
+                     db: Session = Depends(get_db_session)):
+    if len(car_ids) > MAX_QUOTE_CARS:
+        raise HTTPException(status_code=400, detail=f"At most {MAX_QUOTE_CARS} cars per request")
+    try:
+        prices = await crud_pricing.get_prices_async(db=db, car_ids=car_ids)
+        logger.info(f"Pricing retrieved for {len(prices)} cars")
+        return prices
     except Exception as e:
         logger.error(f"Error retrieving pricing: {e}")
         raise HTTPException(status_code=500, detail="Internal Server Error")
@@ -27,22 +47,101 @@ async def get_pricing(car_id: int, db: Session = Depends(get_db_session)):
 async def create_pricing(pricing: PricingCreate, db: Session = Depends(get_db_session)):
     try:
         new_pricing = crud_pricing.create_pricing(db=db, pricing=pricing)
-        logger.info(f"Pricing created for car: {new_pricing.car_id}")
-        return new_pricing
     except Exception as e:
         logger.error(f"Error creating pricing: {e}")
         raise HTTPException(status_code=500, detail="Internal Server Error")
+    if not new_pricing:
+        logger.warning(f"Car not found: {pricing.car_id}")
+        raise HTTPException(status_code=404, detail="Car not found")
+    logger.info(f"Pricing created for car: {new_pricing['car_id']}")
+    return new_pricing
 
 
 @router.put("/pricing/{car_id}", response_model=PricingResponse, dependencies=[Depends(get_current_active_admin)])
 async def update_pricing(car_id: int, pricing: PricingUpdate, db: Session = Depends(get_db_session)):
     try:
         updated_pricing = crud_pricing.update_pricing(db=db, car_id=car_id, pricing=pricing)
-        if not updated_pricing:
-            logger.warning(f"Car not found: {car_id}")
-            raise HTTPException(status_code=404, detail="Car not found")
-        logger.info(f"Pricing updated for car: {car_id}")
-        return updated_pricing
     except Exception as e:
         logger.error(f"Error updating pricing: {e}")
         raise HTTPException(status_code=500, detail="Internal Server Error")
+    if not updated_pricing:
+        logger.warning(f"Car not found: {car_id}")
+        raise HTTPException(status_code=404, detail="Car not found")
+    logger.info(f"Pricing updated for car: {car_id}")
+    return updated_pricing
+
+
+@router.post("/pricing/bulk", dependencies=[Depends(get_current_active_admin)])
+def bulk_update_pricing(changes: PricingBulkUpdate, db: Session = Depends(get_db_session)):
+    # Plain def: the update and cache refresh run in the threadpool instead of on the event loop
+    try:
+        updated = crud_pricing.bulk_update_prices(db=db, changes=changes)
+        logger.info(f"Bulk pricing update: {updated} cars updated")
+        return {"updated": updated}
+    except Exception as e:
+        logger.error(f"Error in bulk pricing update: {e}")
+        raise HTTPException(status_code=500, detail="Internal Server Error")
+
+
+@router.post("/pricing/recompute", dependencies=[Depends(get_current_active_admin)])
+def recompute_pricing(db: Session = Depends(get_db_session)):
+    # Plain def: the batch runs in the threadpool instead of on the event loop
+    try:
+        updated = crud_pricing.recompute_surge(db=db)
+        logger.info(f"Surge pricing recomputed: {updated} cars updated")
+        return {"updated": updated}
+    except Exception as e:
+        logger.error(f"Error recomputing surge pricing: {e}")
+        raise HTTPException(status_code=500, detail="Internal Server Error")
+
+
+@router.get("/pricing/quote", response_model=List[Quote], dependencies=[Depends(get_current_active_user)])
+def quote_rentals(car_ids: List[int] = Query(..., description="Cars to quote"),
+                  start_time: datetime = Query(..., description="Rental start"),
+                  end_time: datetime = Query(..., description="Rental end"),
+                  db: Session = Depends(get_db_session)):
+    # Plain def: recompiling the rate table queries the whole fleet, so it runs in the threadpool
+    if len(car_ids) > MAX_QUOTE_CARS:
+        raise HTTPException(status_code=400, detail=f"At most {MAX_QUOTE_CARS} cars per quote")
+    if start_time >= end_time:
+        raise HTTPException(status_code=400, detail="Invalid rental times: start_time must be before end_time")
+    try:
+        quotes = crud_pricing.quote_rentals(db=db, car_ids=car_ids, start_time=start_time, end_time=end_time)
+        logger.info(f"Quoted {len(quotes)} cars from {start_time} to {end_time}")
+        return quotes
+    except Exception as e:
+        logger.error(f"Error quoting rentals: {e}")
+        raise HTTPException(status_code=500, detail="Internal Server Error")
+
+
+@router.get("/pricing/{car_id}/price", response_model=PricePoint, dependencies=[Depends(get_current_active_user)])
+async def read_price(car_id: int, at: Optional[datetime] = Query(None, description="Point in time (default: now)"),
+                     db: Session = Depends(get_db_session)):
+    try:
+        if at is None:
+            point = crud_price_history.get_current_price(db=db, car_id=car_id)
+        else:
+            point = crud_price_history.price_at(db=db, car_id=car_id, at=at)
+    except Exception as e:
+        logger.error(f"Error retrieving price: {e}")
+        raise HTTPException(status_code=500, detail="Internal Server Error")
+    if point is None:
+        logger.warning(f"No price recorded for car {car_id} at {at or 'present'}")
+        raise HTTPException(status_code=404, detail="No price recorded for this car at that time")
+    return point
+
+
+@router.get("/pricing/{car_id}/history", response_model=List[PricePoint],
+            dependencies=[Depends(get_current_active_admin)])
+async def read_price_history(car_id: int, start: datetime = Query(..., description="Start of the range"),
+                             end: datetime = Query(..., description="End of the range"),
+                             db: Session = Depends(get_db_session)):
+    if start > end:
+        raise HTTPException(status_code=400, detail="Invalid range: start must not be after end")
+    try:
+        series = crud_price_history.price_series(db=db, car_id=car_id, start=start, end=end)
+        logger.info(f"Retrieved {len(series)} price points for car: {car_id}")
+        return series
+    except Exception as e:
+        logger.error(f"Error retrieving price history: {e}")
+        raise HTTPException(status_code=500, detail="Internal Server Error")
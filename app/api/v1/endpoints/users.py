@@ -1,17 +1,24 @@
-from fastapi import APIRouter, Depends, HTTPException
+from typing import Optional
+
+from fastapi import APIRouter, Depends, HTTPException, Response
 from loguru import logger
 from sqlalchemy.orm import Session
 
 from app.core.dependencies import get_db_session, get_current_active_admin, get_current_active_user
 from app.crud import crud_user
 from app.schemas.user import UserInDB, UserUpdate
+from app.utils.pagination import get_cursor, next_cursor, NEXT_CURSOR_HEADER
 
 router = APIRouter()
 
 @router.get("/", response_model=list[UserInDB], dependencies=[Depends(get_current_active_admin)])
-async def get_users(skip: int = 0, limit: int = 10, db: Session = Depends(get_db_session)):
+async def get_users(response: Response, skip: int = 0, limit: int = 10,
+                    after_id: Optional[int] = Depends(get_cursor), db: Session = Depends(get_db_session)):
     try:
-        users = crud_user.get_users(db=db, skip=skip, limit=limit)
+        users = crud_user.get_users(db=db, skip=skip, limit=limit, after_id=after_id)
+        cursor = next_cursor(users, limit)
+        if cursor:
+            response.headers[NEXT_CURSOR_HEADER] = cursor
         logger.info("Users retrieved successfully")
         return users
     except Exception as e:
@@ -38,7 +45,7 @@ async def get_user(user_id: int, db: Session = Depends(get_db_session)):
 @router.put("/{user_id}", response_model=UserInDB, dependencies=[Depends(get_current_active_admin)])
 async def update_user(user_id: int, user: UserUpdate, db: Session = Depends(get_db_session)):
     try:
-        updated_user = crud_user.update_user(db=db, user_id=user_id, user=user)
+        updated_user = await crud_user.update_user_async(db=db, user_id=user_id, user=user)
         if not updated_user:
             logger.warning(f"User not found: {user_id}")
             raise HTTPException(status_code=404, detail="User not found")
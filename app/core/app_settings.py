@@ -14,6 +14,18 @@ class Settings(BaseSettings):
     STRIPE_API_KEY: str
     STRIPE_WEBHOOK_SECRET: str
     REDIS_URL: str
+    LOCAL_CACHE_ENABLED: bool = True
+    LOCAL_CACHE_MAX_ENTRIES: int = 1024
+    LOCAL_CACHE_TTL: int = 30
+    QR_WORKERS: int = 2
+    BOOKING_HOLD_TTL: int = 600
+    BOOKING_ARCHIVE_AFTER_DAYS: int = 365
+    PRICING_JOB_INTERVAL: int = 900
+    PRICING_HORIZON_DAYS: int = 30
+    PRINCIPAL_CACHE_TTL: int = 60
+    FACETS_REBUILD_INTERVAL: int = 3600
+    BCRYPT_ROUNDS: int = 12
+    PASSWORD_HASH_WORKERS: int = 4
 
     class Config:
         env_file = ".env"
@@ -5,8 +5,9 @@ from jose import JWTError, jwt
 from sqlalchemy.orm import Session
 
 from app.core.app_settings import settings
+from app.crud import crud_user
 from app.db.session import SessionLocal
-from app.models.user import User
+from app.schemas.user import UserInDB
 
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="token")
 
@@ -32,19 +33,20 @@ def get_current_user(db: Session = Depends(get_db_session), token: str = Depends
             raise credentials_exception
     except JWTError:
         raise credentials_exception
-    user = db.query(User).filter(User.username == username).first()
+    # The session only checks out a connection if the principal isn't cached
+    user = crud_user.get_principal(db, username)
     if user is None:
         raise credentials_exception
     return user
 
 
-def get_current_active_user(current_user: User = Depends(get_current_user)):
+def get_current_active_user(current_user: UserInDB = Depends(get_current_user)):
     if not current_user.is_active:
         raise HTTPException(status_code=400, detail="Inactive user")
     return current_user
 
 
-def get_current_active_admin(current_user: User = Depends(get_current_user)):
+def get_current_active_admin(current_user: UserInDB = Depends(get_current_user)):
     if current_user.role != "admin":
         raise HTTPException(status_code=400, detail="The user doesn't have enough privileges")
     return current_user
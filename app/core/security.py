@@ -1,6 +1,8 @@
+import asyncio
 import logging
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime, timedelta
-from typing import Optional
+from typing import Optional, Tuple
 
 from fastapi import HTTPException
 from jose import JWTError, jwt
@@ -12,8 +14,12 @@ from app.core.app_config import settings
 logging.basicConfig(level=logging.DEBUG)
 logger = logging.getLogger(__name__)
 
-# Password hashing context using bcrypt
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+# Password hashing context using bcrypt. Hashes below the configured work factor count as
+# outdated, so verify_and_update_password re-hashes them on the next successful login
+pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto",
+                           bcrypt__rounds=settings.BCRYPT_ROUNDS, bcrypt__min_rounds=settings.BCRYPT_ROUNDS)
+
+password_executor = None
 
 
 def create_access_token(data: dict, expires_delta: Optional[timedelta] = None):
@@ -41,5 +47,42 @@ def get_password_hash(password: str) -> str:
 
 
 def verify_password(plain_password: str, hashed_password: str) -> bool:
-    logger.debug(f"Verifying password: {plain_password} with hash: {hashed_password}")
     return pwd_context.verify(plain_password, hashed_password)
+
+
+def verify_and_update_password(plain_password: str, hashed_password: str) -> Tuple[bool, Optional[str]]:
+    """Verify a password, also returning a fresh hash when the stored one is below the current work factor."""
+    return pwd_context.verify_and_update(plain_password, hashed_password)
+
+
+def get_password_executor() -> ThreadPoolExecutor:
+    global password_executor
+    if password_executor is None:
+        password_executor = ThreadPoolExecutor(max_workers=settings.PASSWORD_HASH_WORKERS,
+                                               thread_name_prefix="password-hash")
+    return password_executor
+
+
+def shutdown_password_executor() -> None:
+    global password_executor
+    if password_executor is not None:
+        password_executor.shutdown(wait=False, cancel_futures=True)
+        password_executor = None
+        logger.info("Password hashing executor shut down.")
+
+
+async def get_password_hash_async(password: str) -> str:
+    """
+    Hash a password on the bounded hashing pool so bcrypt never runs on the event loop.
+
+    bcrypt releases the GIL while it works, so threads are enough; the pool size caps how many
+    hashes run at once, so a login burst queues instead of starving other requests of CPU.
+    """
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(get_password_executor(), get_password_hash, password)
+
+
+async def verify_and_update_password_async(plain_password: str, hashed_password: str) -> Tuple[bool, Optional[str]]:
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(get_password_executor(), verify_and_update_password, plain_password,
+                                      hashed_password)
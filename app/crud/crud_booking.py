@@ -1,63 +1,287 @@
-from io import BytesIO
+from datetime import date, datetime
+from typing import Iterator, List, Optional
 
-import qrcode
+from sqlalchemy import and_, delete, func, insert, select, text
+from sqlalchemy.exc import IntegrityError
 from sqlalchemy.orm import Session
 
-from app.models.booking import Booking
-from app.schemas.booking import BookingCreate, BookingUpdate
+from app.crud.crud_hold import HoldConflictError, InvalidHoldError, active_holds, check_holds, place_hold, \
+    release_hold
+from app.crud.crud_occupancy import drop_occupancy, refresh_occupancy
+from app.models.booking import Booking, BookingArchive
+from app.models.car import Car
+from app.models.model_enums import STATUS
+from app.schemas.booking import BookingCreate, BookingUpdate, BookingInDB, BookingHoldCreate
+from app.utils.cache import invalidate_namespace
+from app.utils.pagination import paginate
+
+BOOKINGS_CACHE_NAMESPACE = "bookings"
+EXCLUSION_VIOLATION = "23P01"
+EXPORT_BATCH_SIZE = 1000
+EXPORT_COLUMNS = ["id", "car_id", "user_id", "start_time", "end_time", "price", "status"]
+ARCHIVE_COLUMNS = [column.name for column in BookingArchive.__table__.columns]
+
+
+class BookingConflictError(Exception):
+    """Raised when a booking would overlap an active booking of the same car."""
+
+
+def _is_postgres(db: Session) -> bool:
+    return db.get_bind().dialect.name == "postgresql"
+
+
+def overlapping(db: Session, start_time: datetime, end_time: datetime):
+    """
+    Clause matching active bookings whose period overlaps [start_time, end_time).
+
+    On Postgres the overlap is expressed as a tsrange `&&` so it is answered by the GiST
+    index behind ex_bookings_car_period; other dialects use the plain btree index.
+    """
+    if _is_postgres(db):
+        period = func.tsrange(Booking.start_time, Booking.end_time).op("&&")(func.tsrange(start_time, end_time))
+    else:
+        period = and_(Booking.start_time < end_time, Booking.end_time > start_time)
+    return and_(period, Booking.status != STATUS.CANCELLED.value)
+
+
+def _check_conflict(db: Session, car_id: int, start_time: datetime, end_time: datetime,
+                    exclude_id: Optional[int] = None):
+    """
+    Reject a booking period that overlaps an active booking of the same car.
+
+    On Postgres the ex_bookings_car_period exclusion constraint is the real guarantee and this
+    is only a fast pre-check. Elsewhere the car row is locked first, which serialises writers
+    per car (never globally) so the check and the insert cannot interleave.
+    """
+    if not _is_postgres(db):
+        db.query(Car.id).filter(Car.id == car_id).with_for_update().first()
+    query = db.query(Booking.id).filter(Booking.car_id == car_id, overlapping(db, start_time, end_time))
+    if exclude_id is not None:
+        query = query.filter(Booking.id != exclude_id)
+    if db.query(query.exists()).scalar():
+        raise BookingConflictError(f"Car {car_id} is already booked between {start_time} and {end_time}")
+
+
+def _raise_conflict(db: Session, error: IntegrityError, message: str):
+    db.rollback()
+    code = getattr(error.orig, "pgcode", None) or getattr(error.orig, "sqlstate", None)
+    if code == EXCLUSION_VIOLATION:
+        raise BookingConflictError(message) from error
+    raise error
+
+
+def _commit_booking(db: Session, db_booking: Booking):
+    try:
+        db.commit()
+    except IntegrityError as e:
+        _raise_conflict(db, e, f"Car {db_booking.car_id} is already booked between "
+                               f"{db_booking.start_time} and {db_booking.end_time}")
 
 
 def get_booking(db: Session, booking_id: int):
     return db.query(Booking).filter(Booking.id == booking_id).first()
 
 
-def get_bookings(db: Session, skip: int = 0, limit: int = 10):
-    return db.query(Booking).offset(skip).limit(limit).all()
+def get_bookings(db: Session, skip: int = 0, limit: int = 10, after_id: Optional[int] = None):
+    return paginate(db.query(Booking), Booking.id, skip, limit, after_id).all()
 
 
-def create_booking(db: Session, booking: BookingCreate):
-    db_booking = Booking(**booking.dict())
-    db.add(db_booking)
-    db.commit()
-    db.refresh(db_booking)
+def hold_booking(db: Session, hold: BookingHoldCreate, user_id: int) -> dict:
+    """
+    Place a short-lived checkout hold on a car for a period.
+
+    Existing bookings are only read, never locked: the hold itself lives in Redis, so contention
+    between customers racing for the same car stays out of the database until they book.
+    """
+    query = db.query(Booking.id).filter(Booking.car_id == hold.car_id, overlapping(db, hold.start_time, hold.end_time))
+    if db.query(query.exists()).scalar():
+        raise BookingConflictError(f"Car {hold.car_id} is already booked between {hold.start_time} and {hold.end_time}")
+    try:
+        return place_hold(hold.car_id, user_id, hold.start_time, hold.end_time)
+    except HoldConflictError as e:
+        raise BookingConflictError(str(e)) from e
 
-    # Generate QR code
-    qr_data = f"Booking ID: {db_booking.id}, Car ID: {db_booking.car_id}, User ID: {db_booking.user_id}, Start Time: {db_booking.start_time}, End Time: {db_booking.end_time}"
-    qr = qrcode.QRCode(
-        version=1,
-        error_correction=qrcode.constants.ERROR_CORRECT_L,
-        box_size=10,
-        border=4,
-    )
-    qr.add_data(qr_data)
-    qr.make(fit=True)
-
-    img = qr.make_image(fill='black', back_color='white')
-    buffer = BytesIO()
-    img.save(buffer, format="PNG")
-    qr_code_image = buffer.getvalue()
-
-    # Assuming you have a field in Booking model to store QR code image
-    db_booking.qr_code = qr_code_image
+
+def stream_bookings(db: Session, start: Optional[datetime] = None, end: Optional[datetime] = None,
+                    car_id: Optional[int] = None, user_id: Optional[int] = None,
+                    batch_size: int = EXPORT_BATCH_SIZE) -> Iterator[tuple]:
+    """
+    Yield bookings starting in [start, end) as plain row tuples (in EXPORT_COLUMNS order).
+
+    Archived history comes first, then live bookings, each through a server-side cursor
+    `batch_size` rows at a time, so memory stays flat however much history matches.
+    """
+    for table in (BookingArchive, Booking):
+        query = select(*(getattr(table, column) for column in EXPORT_COLUMNS))
+        if start is not None:
+            query = query.where(table.start_time >= start)
+        if end is not None:
+            query = query.where(table.start_time < end)
+        if car_id is not None:
+            query = query.where(table.car_id == car_id)
+        if user_id is not None:
+            query = query.where(table.user_id == user_id)
+        result = db.execute(query.order_by(table.id).execution_options(yield_per=batch_size))
+        for row in result:
+            yield tuple(row)
+
+
+def _archive_partition(month: date):
+    upper = date(month.year + month.month // 12, month.month % 12 + 1, 1)
+    return text(f"CREATE TABLE IF NOT EXISTS {BookingArchive.__tablename__}_y{month.year}m{month.month:02d} "
+                f"PARTITION OF {BookingArchive.__tablename__} FOR VALUES FROM ('{month}') TO ('{upper}')")
+
+
+def archive_bookings(db: Session, cutoff: datetime) -> int:
+    """
+    Move bookings that ended before `cutoff` into bookings_archive, returning how many moved.
+
+    On Postgres the monthly partitions the rows land in are created first, and the move is a
+    single DELETE ... RETURNING feeding the INSERT, so no booking can slip between the two.
+    The occupancy bitmaps of the affected cars are dropped afterwards and rebuilt on their next
+    read, so the calendar answers the same whether a bitmap predates the move or not.
+    """
+    stale = Booking.end_time < cutoff
+    if _is_postgres(db):
+        months = db.query(func.date_trunc("month", Booking.start_time)).filter(stale).distinct()
+        for (month,) in months.all():
+            db.execute(_archive_partition(month.date()))
+        moved = delete(Booking).where(stale).returning(*(getattr(Booking, column) for column in ARCHIVE_COLUMNS)).cte()
+        car_ids = db.execute(insert(BookingArchive).from_select(ARCHIVE_COLUMNS, select(moved))
+                             .returning(BookingArchive.car_id)).scalars().all()
+    else:
+        car_ids = db.execute(select(Booking.car_id).where(stale)).scalars().all()
+        db.execute(insert(BookingArchive).from_select(
+            ARCHIVE_COLUMNS, select(*(getattr(Booking, column) for column in ARCHIVE_COLUMNS)).where(stale)))
+        db.execute(delete(Booking).where(stale))
     db.commit()
+    if car_ids:
+        invalidate_namespace(BOOKINGS_CACHE_NAMESPACE)  # Invalidate cached availability searches
+        drop_occupancy(sorted(set(car_ids)))
+    return len(car_ids)
+
+
+def _check_holds(car_id: int, start_time: datetime, end_time: datetime):
+    try:
+        check_holds(active_holds([car_id])[car_id], None, start_time, end_time)
+    except HoldConflictError as e:
+        raise BookingConflictError(str(e)) from e
+
+
+def create_booking(db: Session, booking: BookingCreate, user_id: Optional[int] = None):
+    """
+    Create a booking, honouring other customers' holds on the car and consuming the booking's own.
+
+    `user_id` is the authenticated user making the booking: only their holds can be redeemed,
+    whoever the booking is for, and none when it isn't known.
+    """
+    holds = active_holds([booking.car_id])[booking.car_id]
+    try:
+        hold = check_holds(holds, user_id, booking.start_time, booking.end_time, booking.hold_id)
+    except HoldConflictError as e:
+        raise BookingConflictError(str(e)) from e
+    _check_conflict(db, booking.car_id, booking.start_time, booking.end_time)
+    db_booking = Booking(**booking.dict(exclude={"hold_id"}))
+    db.add(db_booking)
+    _commit_booking(db, db_booking)
     db.refresh(db_booking)
+    invalidate_namespace(BOOKINGS_CACHE_NAMESPACE)  # Invalidate cached availability searches
+    refresh_occupancy(db, db_booking.car_id, db_booking.start_time, db_booking.end_time)
+    if hold:
+        release_hold(hold)
 
     return db_booking
 
 
+def create_bookings(db: Session, bookings: List[BookingCreate], user_id: Optional[int] = None) -> List[dict]:
+    """
+    Create a batch of bookings in one transaction, returning a result per requested booking.
+
+    Conflicts against existing bookings are found with a single query over the batch's cars
+    and time window, and conflicts inside the batch are resolved first-come in request order.
+    Bookings overlapping another customer's hold, or redeeming a hold that expired, are
+    reported as conflicts; only holds of `user_id`, the authenticated user, can be redeemed.
+    Accepted bookings are inserted with one executemany. If a concurrent writer wins a race for
+    any of them, the exclusion constraint rejects the whole batch with BookingConflictError.
+    """
+    car_ids = sorted({booking.car_id for booking in bookings})
+    if not _is_postgres(db):
+        db.query(Car.id).filter(Car.id.in_(car_ids)).order_by(Car.id).with_for_update().all()
+    window_start = min(booking.start_time for booking in bookings)
+    window_end = max(booking.end_time for booking in bookings)
+    taken = {}
+    for car_id, start_time, end_time in db.query(Booking.car_id, Booking.start_time, Booking.end_time).filter(
+            Booking.car_id.in_(car_ids), overlapping(db, window_start, window_end)):
+        taken.setdefault(car_id, []).append((start_time, end_time))
+    holds = active_holds(car_ids)
+
+    results, accepted, redeemed = [], [], []
+    for index, booking in enumerate(bookings):
+        periods = taken.setdefault(booking.car_id, [])
+        if any(start < booking.end_time and end > booking.start_time for start, end in periods):
+            results.append({"index": index, "status": "conflict",
+                            "detail": f"Car {booking.car_id} is already booked between "
+                                      f"{booking.start_time} and {booking.end_time}"})
+            continue
+        try:
+            hold = check_holds(holds[booking.car_id], user_id, booking.start_time, booking.end_time, booking.hold_id)
+        except (HoldConflictError, InvalidHoldError) as e:
+            results.append({"index": index, "status": "conflict", "detail": str(e)})
+            continue
+        if hold:
+            redeemed.append(hold)
+        periods.append((booking.start_time, booking.end_time))
+        values = {**booking.dict(exclude={"hold_id"}), "status": STATUS.PENDING.value}
+        results.append({"index": index, "status": "created", "values": values})
+        accepted.append(values)
+
+    if accepted:
+        try:
+            ids = db.execute(insert(Booking).returning(Booking.id, sort_by_parameter_order=True),
+                             accepted).scalars().all()
+            db.commit()
+        except IntegrityError as e:
+            _raise_conflict(db, e, "A concurrent booking conflicts with this batch")
+        invalidate_namespace(BOOKINGS_CACHE_NAMESPACE)  # Invalidate cached availability searches
+        for values in accepted:
+            refresh_occupancy(db, values["car_id"], values["start_time"], values["end_time"])
+        for hold in redeemed:
+            release_hold(hold)
+        created = iter(ids)
+        for result in results:
+            if result["status"] == "created":
+                result["booking"] = BookingInDB(id=next(created), **result.pop("values"))
+    return results
+
+
 def update_booking(db: Session, booking_id: int, booking: BookingUpdate):
     db_booking = db.query(Booking).filter(Booking.id == booking_id).first()
     if db_booking:
+        previous = (db_booking.car_id, db_booking.start_time, db_booking.end_time)
         for key, value in booking.dict(exclude_unset=True).items():
             setattr(db_booking, key, value)
-        db.commit()
+        try:
+            if (db_booking.car_id, db_booking.start_time, db_booking.end_time) != previous:
+                # A booking can't be moved into a period someone is holding at checkout
+                _check_holds(db_booking.car_id, db_booking.start_time, db_booking.end_time)
+            _check_conflict(db, db_booking.car_id, db_booking.start_time, db_booking.end_time, exclude_id=booking_id)
+        except BookingConflictError:
+            db.rollback()  # Don't leave the rejected times pending on the session
+            raise
+        _commit_booking(db, db_booking)
         db.refresh(db_booking)
+        invalidate_namespace(BOOKINGS_CACHE_NAMESPACE)  # Invalidate cached availability searches
+        refresh_occupancy(db, *previous)
+        refresh_occupancy(db, db_booking.car_id, db_booking.start_time, db_booking.end_time)
     return db_booking
 
 
 def delete_booking(db: Session, booking_id: int):
     db_booking = db.query(Booking).filter(Booking.id == booking_id).first()
     if db_booking:
+        period = (db_booking.car_id, db_booking.start_time, db_booking.end_time)
         db.delete(db_booking)
         db.commit()
+        invalidate_namespace(BOOKINGS_CACHE_NAMESPACE)  # Invalidate cached availability searches
+        refresh_occupancy(db, *period)
     return db_booking
@@ -1,93 +1,384 @@
+import math
+from typing import Iterable, Iterator, Optional
+
+from pydantic import ValidationError
+from sqlalchemy import exists, func, insert, or_, select
 from sqlalchemy.orm import Session
 
+from app.crud import crud_facets
+from app.crud.crud_booking import overlapping, BOOKINGS_CACHE_NAMESPACE
+from app.crud.crud_price_history import PRICING_CACHE_NAMESPACE, record_prices, publish_prices, drop_prices, \
+    refresh_price_snapshot
+from app.models.booking import Booking
 from app.models.car import Car
+from app.models.model_enums import VehicleType
 from app.schemas.car import CarCreate, CarUpdate, CarInDB
-from app.utils.cache import get_cache, set_cache, delete_cache
+from app.utils import async_cache
+from app.utils.cache import get_cache, set_cache, delete_cache, namespaced_key, invalidate_namespace, \
+    normalize_criteria, canonical_key, get_or_compute
+from app.utils.geo import encode_geohash, covering_cells, bounding_box, haversine_km
+from app.utils.pagination import paginate
+
+CARS_CACHE_NAMESPACE = "cars"
+# Distance searches rank at most this many cars, so skip + limit can't go past it
+MAX_NEAR_RESULTS = 500
+# Candidates fetched per requested result, to absorb where the planar estimate and haversine disagree
+NEAR_CANDIDATE_FACTOR = 2
+
+
+def _serialize_cars(db_cars) -> list:
+    return [CarInDB.from_orm(car).dict() for car in db_cars]
+
+
+def _page_key(skip: int, limit: int, after_id: Optional[int]) -> str:
+    if after_id is not None:
+        return f"after{after_id}_{limit}"
+    return f"{skip}_{limit}"
+
+
+def _filters_availability(search_criteria: dict) -> bool:
+    return bool(search_criteria.get('start_time') and search_criteria.get('end_time'))
+
+
+def _text_match(db: Session, column, term: str):
+    """
+    Return a (filter, rank) pair for a typo-tolerant substring match of `term` against `column`.
+
+    On Postgres both the ILIKE and the word-similarity (%>) operators are served by the
+    column's pg_trgm GIN index and results are ranked by word similarity. Other dialects
+    fall back to a plain ILIKE with no ranking.
+    """
+    if db.get_bind().dialect.name == "postgresql":
+        return or_(column.ilike(f"%{term}%"), column.op("%>")(term)), func.word_similarity(term, column)
+    return column.ilike(f"%{term}%"), None
+
+
+def _geohash(latitude: Optional[float], longitude: Optional[float]) -> Optional[str]:
+    if latitude is None or longitude is None:
+        return None
+    return encode_geohash(latitude, longitude)
+
+
+def _car_values(car) -> dict:
+    values = car.dict()
+    values['vehicle_type'] = VehicleType(getattr(values['vehicle_type'], 'value', values['vehicle_type']))
+    values['geohash'] = _geohash(values.get('latitude'), values.get('longitude'))
+    return values
+
+
+def _query_nearest(query, near: tuple, radius: float, skip: int, limit: int):
+    """
+    Narrow `query` to cars within `radius` km of `near` and return them sorted by distance.
+
+    The geohash prefix index picks the handful of cells around the point and the bounding box
+    trims their corners. The database then orders those candidates by a planar distance estimate
+    and returns only the nearest few, as bare coordinates; they get an exact haversine distance
+    and only the cars on the requested page are loaded. However wide the radius, no more than
+    NEAR_CANDIDATE_FACTOR * (skip + limit) rows leave the database.
+    """
+    latitude, longitude = near
+    min_lat, max_lat, min_lon, max_lon = bounding_box(latitude, longitude, radius)
+    query = query.filter(Car.latitude.between(min_lat, max_lat))
+    if min_lon >= -180.0 and max_lon <= 180.0:
+        query = query.filter(Car.longitude.between(min_lon, max_lon))
+    cells = covering_cells(latitude, longitude, radius)
+    if cells:
+        query = query.filter(or_(*[Car.geohash.like(f"{cell}%") for cell in cells]))
+
+    d_lat, d_lon = Car.latitude - latitude, (Car.longitude - longitude) * math.cos(math.radians(latitude))
+    candidates = (query.with_entities(Car.id, Car.latitude, Car.longitude)
+                  .order_by(d_lat * d_lat + d_lon * d_lon, Car.id)
+                  .limit(NEAR_CANDIDATE_FACTOR * (skip + limit)))
+    distances = ((haversine_km(latitude, longitude, car_lat, car_lon), car_id)
+                 for car_id, car_lat, car_lon in candidates)
+    page = [car_id for _, car_id in sorted(item for item in distances if item[0] <= radius)[skip:skip + limit]]
+    if not page:
+        return []
+    cars = {car.id: car for car in query.filter(Car.id.in_(page))}
+    return [cars[car_id] for car_id in page]
+
+
+def _query_car(db: Session, car_id: int):
+    return db.query(Car).filter(Car.id == car_id).first()
+
+
+def _query_cars(db: Session, skip: int, limit: int, after_id: Optional[int]):
+    return paginate(db.query(Car), Car.id, skip, limit, after_id).all()
+
+
+def _filter_cars(db: Session, search_criteria: dict):
+    """Return the car query narrowed by `search_criteria` and its relevance rank expression, if any."""
+    query = db.query(Car)
+    ranks = []
+    if 'model' in search_criteria:
+        match, rank = _text_match(db, Car.model, search_criteria['model'])
+        query = query.filter(match)
+        ranks.append(rank)
+    if 'available' in search_criteria:
+        query = query.filter(Car.available == search_criteria['available'])
+    if 'min_price' in search_criteria:
+        query = query.filter(Car.daily_rate >= search_criteria['min_price'])
+    if 'max_price' in search_criteria:
+        query = query.filter(Car.daily_rate <= search_criteria['max_price'])
+    if 'vehicle_type' in search_criteria:
+        query = query.filter(Car.vehicle_type == VehicleType(search_criteria['vehicle_type']))
+    if 'location' in search_criteria:
+        match, rank = _text_match(db, Car.location, search_criteria['location'])
+        query = query.filter(match)
+        ranks.append(rank)
+    if 'daily_rate' in search_criteria:
+        query = query.filter(Car.daily_rate == search_criteria['daily_rate'])
+    if _filters_availability(search_criteria):
+        # Anti-join against the interval index: one index probe per candidate car
+        query = query.filter(~exists().where(
+            Booking.car_id == Car.id,
+            overlapping(db, search_criteria['start_time'], search_criteria['end_time']),
+        ))
+    ranks = [rank for rank in ranks if rank is not None]
+    return query, sum(ranks[1:], ranks[0]) if ranks else None
+
+
+def _query_search_cars(db: Session, search_criteria: dict, skip: int, limit: int, after_id: Optional[int]):
+    query, rank = _filter_cars(db, search_criteria)
+    if search_criteria.get('near'):
+        # Distance order can't be resumed from an id cursor; the endpoint rejects one
+        return _query_nearest(query, search_criteria['near'], search_criteria['radius'], skip, limit)
+    return paginate(query, Car.id, skip, limit, after_id, rank).all()
+
+
+def _insert_car(db: Session, car: CarCreate):
+    db_car = Car(**_car_values(car))
+    db.add(db_car)
+    db.flush()
+    record_prices(db, [(db_car.id, db_car.daily_rate)])  # New cars start without surge
+    db.commit()
+    db.refresh(db_car)
+    publish_prices([(db_car.id, db_car.daily_rate, db_car.surge_multiplier)])
+    return db_car, crud_facets.facet_delta([], crud_facets.facet_fields(db_car))
+
+
+def _update_car(db: Session, car_id: int, car: CarUpdate):
+    db_car = _query_car(db, car_id)
+    old_fields = crud_facets.facet_fields(db_car)
+    if db_car:
+        old_rate = db_car.daily_rate
+        for key, value in car.dict(exclude_unset=True).items():
+            setattr(db_car, key, value)
+        db_car.geohash = _geohash(db_car.latitude, db_car.longitude)
+        if db_car.daily_rate != old_rate:
+            record_prices(db, [(db_car.id, db_car.daily_rate * db_car.surge_multiplier)])
+        db.commit()
+        db.refresh(db_car)
+        if db_car.daily_rate != old_rate:
+            invalidate_namespace(PRICING_CACHE_NAMESPACE)
+            publish_prices([(db_car.id, db_car.daily_rate, db_car.surge_multiplier)])
+    return db_car, crud_facets.facet_delta(old_fields, crud_facets.facet_fields(db_car))
+
+
+def _delete_car(db: Session, car_id: int):
+    db_car = _query_car(db, car_id)
+    old_fields = crud_facets.facet_fields(db_car)
+    if db_car:
+        db.delete(db_car)
+        db.commit()
+        drop_prices([car_id])
+    return db_car, crud_facets.facet_delta(old_fields, [])
 
 
 def get_car(db: Session, car_id: int):
     cache_key = f"car_{car_id}"
     cached_car = get_cache(cache_key)
     if cached_car:
-        return cached_car
+        return CarInDB(**cached_car)
 
-    db_car = db.query(Car).filter(Car.id == car_id).first()
+    db_car = _query_car(db, car_id)
     if db_car:
-        set_cache(cache_key, db_car)
+        set_cache(cache_key, CarInDB.from_orm(db_car).dict())
     return db_car
 
 
-def get_cars(db: Session, skip: int = 0, limit: int = 10):
-    cache_key = f"cars_{skip}_{limit}"
+def get_cars(db: Session, skip: int = 0, limit: int = 10, after_id: Optional[int] = None):
+    cache_key = namespaced_key(CARS_CACHE_NAMESPACE, f"cars_{_page_key(skip, limit, after_id)}")
     cached_cars = get_cache(cache_key)
     if cached_cars:
         return [CarInDB(**car) for car in cached_cars]
 
-    db_cars = db.query(Car).offset(skip).limit(limit).all()
-    db_cars_dict = [CarInDB.from_orm(car).dict() for car in db_cars]
-    set_cache(cache_key, db_cars_dict)
-    return db_cars
-
-    db_cars = db.query(Car).offset(skip).limit(limit).all()
-    set_cache(cache_key, db_cars)
+    db_cars = _query_cars(db, skip, limit, after_id)
+    set_cache(cache_key, _serialize_cars(db_cars))
     return db_cars
 
 
 def create_car(db: Session, car: CarCreate):
-    db_car = Car(**car.dict())
-    db.add(db_car)
-    db.commit()
-    db.refresh(db_car)
-    delete_cache("cars_*")  # Invalidate the cache for car lists
+    db_car, delta = _insert_car(db, car)
+    crud_facets.apply_facet_delta(delta)
+    invalidate_namespace(CARS_CACHE_NAMESPACE)  # Invalidate the cache for car lists and searches
     return db_car
 
 
 def update_car(db: Session, car_id: int, car: CarUpdate):
-    db_car = db.query(Car).filter(Car.id == car_id).first()
+    db_car, delta = _update_car(db, car_id, car)
     if db_car:
-        for key, value in car.dict(exclude_unset=True).items():
-            setattr(db_car, key, value)
-        db.commit()
-        db.refresh(db_car)
+        crud_facets.apply_facet_delta(delta)
         delete_cache(f"car_{car_id}")  # Invalidate the cache for this car
-        delete_cache("cars_*")  # Invalidate the cache for car lists
+        invalidate_namespace(CARS_CACHE_NAMESPACE)  # Invalidate the cache for car lists and searches
     return db_car
 
 
 def delete_car(db: Session, car_id: int):
-    db_car = db.query(Car).filter(Car.id == car_id).first()
+    db_car, delta = _delete_car(db, car_id)
     if db_car:
-        db.delete(db_car)
-        db.commit()
+        crud_facets.apply_facet_delta(delta)
         delete_cache(f"car_{car_id}")  # Invalidate the cache for this car
-        delete_cache("cars_*")  # Invalidate the cache for car lists
+        invalidate_namespace(CARS_CACHE_NAMESPACE)  # Invalidate the cache for car lists and searches
     return db_car
 
 
-def search_cars(db: Session, search_criteria: dict, skip: int = 0, limit: int = 10):
-    cache_key = f"search_cars_{str(search_criteria)}_{skip}_{limit}"
-    cached_cars = get_cache(cache_key)
-    if cached_cars:
-        return cached_cars
+def search_cars(db: Session, search_criteria: dict, skip: int = 0, limit: int = 10,
+                after_id: Optional[int] = None):
+    search_criteria = normalize_criteria(search_criteria)
+    cache_key = namespaced_key(CARS_CACHE_NAMESPACE,
+                               f"{canonical_key('search_cars', search_criteria)}_{_page_key(skip, limit, after_id)}")
+    if _filters_availability(search_criteria):
+        cache_key = namespaced_key(BOOKINGS_CACHE_NAMESPACE, cache_key)
 
-    query = db.query(Car)
-    if 'model' in search_criteria:
-        query = query.filter(Car.model.ilike(f"%{search_criteria['model']}%"))
-    if 'available' in search_criteria:
-        query = query.filter(Car.available == search_criteria['available'])
-    if 'min_price' in search_criteria:
-        query = query.filter(Car.base_price >= search_criteria['min_price'])
-    if 'max_price' in search_criteria:
-        query = query.filter(Car.base_price <= search_criteria['max_price'])
-    if 'vehicle_type' in search_criteria:
-        query = query.filter(Car.vehicle_type == search_criteria['vehicle_type'])
-    if 'location' in search_criteria:
-        query = query.filter(Car.location.ilike(f"%{search_criteria['location']}%"))
-    if 'daily_rate' in search_criteria:
-        query = query.filter(Car.daily_rate == search_criteria['daily_rate'])
+    cars = get_or_compute(
+        cache_key, lambda: _serialize_cars(_query_search_cars(db, search_criteria, skip, limit, after_id)))
+    return [CarInDB(**car) for car in cars]
+
+
+# Async variants for the API layer: cache traffic goes through async_redis so it never blocks the event loop
 
-    db_cars = query.offset(skip).limit(limit).all()
-    # Assuming db_cars is a list of car objects
-    db_cars_dict: dict = {car.id: car.__dict__ for car in db_cars}
-    set_cache(cache_key, db_cars_dict)
+async def get_car_async(db: Session, car_id: int):
+    cache_key = f"car_{car_id}"
+    cached_car = await async_cache.get_cache(cache_key)
+    if cached_car:
+        return CarInDB(**cached_car)
+
+    db_car = _query_car(db, car_id)
+    if db_car:
+        await async_cache.set_cache(cache_key, CarInDB.from_orm(db_car).dict())
+    return db_car
+
+
+async def get_cars_async(db: Session, skip: int = 0, limit: int = 10, after_id: Optional[int] = None):
+    cache_key = await async_cache.namespaced_key(CARS_CACHE_NAMESPACE, f"cars_{_page_key(skip, limit, after_id)}")
+    cached_cars = await async_cache.get_cache(cache_key)
+    if cached_cars:
+        return [CarInDB(**car) for car in cached_cars]
+
+    db_cars = _query_cars(db, skip, limit, after_id)
+    await async_cache.set_cache(cache_key, _serialize_cars(db_cars))
     return db_cars
+
+
+async def create_car_async(db: Session, car: CarCreate):
+    db_car, delta = _insert_car(db, car)
+    await crud_facets.apply_facet_delta_async(delta)
+    await async_cache.invalidate_namespace(CARS_CACHE_NAMESPACE)
+    return db_car
+
+
+async def update_car_async(db: Session, car_id: int, car: CarUpdate):
+    db_car, delta = _update_car(db, car_id, car)
+    if db_car:
+        await crud_facets.apply_facet_delta_async(delta)
+        await async_cache.delete_cache(f"car_{car_id}")
+        await async_cache.invalidate_namespace(CARS_CACHE_NAMESPACE)
+    return db_car
+
+
+async def delete_car_async(db: Session, car_id: int):
+    db_car, delta = _delete_car(db, car_id)
+    if db_car:
+        await crud_facets.apply_facet_delta_async(delta)
+        await async_cache.delete_cache(f"car_{car_id}")
+        await async_cache.invalidate_namespace(CARS_CACHE_NAMESPACE)
+    return db_car
+
+
+async def search_cars_async(db: Session, search_criteria: dict, skip: int = 0, limit: int = 10,
+                            after_id: Optional[int] = None):
+    search_criteria = normalize_criteria(search_criteria)
+    cache_key = await async_cache.namespaced_key(
+        CARS_CACHE_NAMESPACE, f"{canonical_key('search_cars', search_criteria)}_{_page_key(skip, limit, after_id)}")
+    if _filters_availability(search_criteria):
+        cache_key = await async_cache.namespaced_key(BOOKINGS_CACHE_NAMESPACE, cache_key)
+
+    cars = await async_cache.get_or_compute(
+        cache_key, lambda: _serialize_cars(_query_search_cars(db, search_criteria, skip, limit, after_id)))
+    return [CarInDB(**car) for car in cars]
+
+
+async def get_car_facets_async(db: Session, search_criteria: dict):
+    """
+    Return vehicle_type, location and price band counts for the cars matching `search_criteria`.
+
+    Without filters the counts come straight from the incrementally maintained Redis aggregates;
+    with filters they are computed in a single GROUP BY pass and cached like a search page.
+    """
+    search_criteria = normalize_criteria(search_criteria)
+    if not search_criteria:
+        return await crud_facets.get_facets_async(db)
+
+    cache_key = await async_cache.namespaced_key(CARS_CACHE_NAMESPACE, canonical_key('car_facets', search_criteria))
+    if _filters_availability(search_criteria):
+        cache_key = await async_cache.namespaced_key(BOOKINGS_CACHE_NAMESPACE, cache_key)
+
+    def compute():
+        query, _ = _filter_cars(db, search_criteria)
+        return crud_facets.fold_facet_rows(crud_facets.grouped_facet_rows(query))
+
+    return await async_cache.get_or_compute(cache_key, compute)
+
+
+BULK_BATCH_SIZE = 1000
+MAX_REPORTED_ERRORS = 100
+EXPORT_COLUMNS = ["id", *(name for name in CarInDB.model_fields if name != "id")]
+
+
+def _insert_batch(db: Session, batch: list) -> int:
+    rows = db.execute(insert(Car).returning(Car.id, Car.daily_rate), batch).all()
+    record_prices(db, rows)
+    return len(rows)
+
+
+def bulk_create_cars(db: Session, records: Iterable[dict], batch_size: int = BULK_BATCH_SIZE) -> dict:
+    """
+    Validate and insert cars from an iterable of raw dicts in a single transaction.
+
+    Rows are flushed in executemany batches as they stream in, so memory stays bounded by
+    `batch_size`. Invalid rows are skipped and reported; caches and facets are refreshed
+    once at the end instead of per car.
+    """
+    imported, errors, batch = 0, [], []
+    try:
+        for line, record in enumerate(records, start=1):
+            try:
+                batch.append(_car_values(CarCreate(**record)))
+            except (ValidationError, TypeError, ValueError) as e:
+                if len(errors) < MAX_REPORTED_ERRORS:
+                    errors.append({"line": line, "detail": str(e)})
+                continue
+            if len(batch) >= batch_size:
+                imported += _insert_batch(db, batch)
+                batch = []
+        if batch:
+            imported += _insert_batch(db, batch)
+        db.commit()
+    except Exception:
+        db.rollback()
+        raise
+
+    if imported:
+        invalidate_namespace(CARS_CACHE_NAMESPACE)
+        crud_facets.rebuild_facets(db)
+        refresh_price_snapshot(db)
+    return {"imported": imported, "errors": errors}
+
+
+def stream_cars(db: Session, batch_size: int = BULK_BATCH_SIZE) -> Iterator[tuple]:
+    """Yield every car as a plain row tuple (in EXPORT_COLUMNS order) through a server-side cursor."""
+    columns = [getattr(Car, column) for column in EXPORT_COLUMNS]
+    result = db.execute(select(*columns).order_by(Car.id).execution_options(yield_per=batch_size))
+    for row in result:
+        yield tuple(row)
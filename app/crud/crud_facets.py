@@ -0,0 +1,197 @@
+import secrets
+from collections import Counter
+
+from sqlalchemy import case, func
+from sqlalchemy.orm import Session
+from starlette.concurrency import run_in_threadpool
+
+from app.core.app_settings import settings
+from app.core.redis_config import redis_client, get_redis
+from app.models.car import Car
+from app.utils.cache import LOCK_PREFIX
+
+FACETS_KEY_PREFIX = "car_facets"
+FACET_NAMES = ("vehicle_type", "location", "price_band")
+FACETS_BUILT_KEY = f"{FACETS_KEY_PREFIX}:built"
+FACETS_REBUILD_LOCK = f"{LOCK_PREFIX}:{FACETS_KEY_PREFIX}"
+# Longest a rebuild may hold the lock; its building keys expire with it if the worker dies
+FACETS_REBUILD_TIMEOUT_MS = 60_000
+
+# Lower bounds of the daily-rate bands shown in the search sidebar
+PRICE_BANDS = [0, 50, 100, 200, 500]
+UNKNOWN_LOCATION = "unknown"
+
+
+def _facet_key(name: str) -> str:
+    return f"{FACETS_KEY_PREFIX}:{name}"
+
+
+def _building_key(name: str) -> str:
+    return f"{FACETS_KEY_PREFIX}:building:{name}"
+
+
+def _journal_key(name: str) -> str:
+    return f"{FACETS_KEY_PREFIX}:journal:{name}"
+
+
+DELTA_KEYS = [_facet_key(name) for name in FACET_NAMES] + [_journal_key(name) for name in FACET_NAMES] \
+    + [FACETS_REBUILD_LOCK]
+FINISH_KEYS = [_building_key(name) for name in FACET_NAMES] + [_facet_key(name) for name in FACET_NAMES] \
+    + [_journal_key(name) for name in FACET_NAMES] + [FACETS_BUILT_KEY, FACETS_REBUILD_LOCK]
+
+# Deltas go to the live hashes and, while a rebuild holds the lock, to its journal as well, in one
+# script so a rebuild can't swap the hashes between the two. ARGV is (facet index, value, count) triples.
+APPLY_DELTA_SCRIPT = """
+local rebuilding = redis.call('EXISTS', KEYS[7]) == 1
+for i = 1, #ARGV, 3 do
+    local facet = tonumber(ARGV[i])
+    redis.call('HINCRBY', KEYS[facet], ARGV[i + 1], ARGV[i + 2])
+    if rebuilding then
+        redis.call('HINCRBY', KEYS[facet + 3], ARGV[i + 1], ARGV[i + 2])
+    end
+end
+"""
+APPLY_DELTA = redis_client.register_script(APPLY_DELTA_SCRIPT)
+
+# Replays the deltas journaled since the rebuild read the fleet onto the rebuilt hashes, swaps them
+# in and marks the aggregates built for FACETS_REBUILD_INTERVAL seconds. Does nothing if the lock lapsed.
+FINISH_REBUILD_SCRIPT = redis_client.register_script("""
+if redis.call('GET', KEYS[11]) ~= ARGV[1] then
+    return 0
+end
+for facet = 1, 3 do
+    local entries = redis.call('HGETALL', KEYS[facet + 6])
+    for i = 1, #entries, 2 do
+        redis.call('HINCRBY', KEYS[facet], entries[i], entries[i + 1])
+    end
+    if redis.call('EXISTS', KEYS[facet]) == 1 then
+        redis.call('RENAME', KEYS[facet], KEYS[facet + 3])
+        redis.call('PERSIST', KEYS[facet + 3])
+    else
+        redis.call('DEL', KEYS[facet + 3])
+    end
+    redis.call('DEL', KEYS[facet + 6])
+end
+redis.call('SET', KEYS[10], 1, 'EX', ARGV[2])
+redis.call('DEL', KEYS[11])
+return 1
+""")
+
+
+def price_band(daily_rate: float) -> str:
+    for lower, upper in zip(PRICE_BANDS, PRICE_BANDS[1:]):
+        if daily_rate < upper:
+            return f"{lower}-{upper}"
+    return f"{PRICE_BANDS[-1]}+"
+
+
+def price_band_expr():
+    whens = [(Car.daily_rate < upper, f"{lower}-{upper}") for lower, upper in zip(PRICE_BANDS, PRICE_BANDS[1:])]
+    return case(*whens, else_=f"{PRICE_BANDS[-1]}+")
+
+
+def _label(value) -> str:
+    return getattr(value, "value", value)
+
+
+def facet_fields(car) -> list:
+    """Return the (facet, value) pairs a car is counted under."""
+    if car is None:
+        return []
+    return [
+        ("vehicle_type", _label(car.vehicle_type)),
+        ("location", car.location or UNKNOWN_LOCATION),
+        ("price_band", price_band(car.daily_rate)),
+    ]
+
+
+def facet_delta(old_fields: list, new_fields: list) -> Counter:
+    delta = Counter(new_fields)
+    delta.subtract(Counter(old_fields))
+    return Counter({field: count for field, count in delta.items() if count})
+
+
+def fold_facet_rows(rows) -> dict:
+    """Fold (vehicle_type, location, price_band, count) rows from one GROUP BY into per-facet counts."""
+    facets = {name: Counter() for name in FACET_NAMES}
+    for vehicle_type, location, band, count in rows:
+        facets["vehicle_type"][_label(vehicle_type)] += count
+        facets["location"][location or UNKNOWN_LOCATION] += count
+        facets["price_band"][band] += count
+    result = {name: dict(counts) for name, counts in facets.items()}
+    result["total"] = sum(facets["vehicle_type"].values())
+    return result
+
+
+def grouped_facet_rows(query):
+    band = price_band_expr()
+    return query.with_entities(Car.vehicle_type, Car.location, band, func.count(Car.id)) \
+        .group_by(Car.vehicle_type, Car.location, band).all()
+
+
+def _facet_hashes(raw: list) -> dict:
+    result = {}
+    for name, counts in zip(FACET_NAMES, raw):
+        result[name] = {key.decode(): int(value) for key, value in counts.items() if int(value) > 0}
+    result["total"] = sum(result["vehicle_type"].values())
+    return result
+
+
+def rebuild_facets(db: Session) -> dict:
+    """
+    Recompute the fleet-wide facet counts from the database and replace the Redis aggregates.
+
+    The counts are written to building keys and renamed over the live hashes together with the
+    deltas journaled while the fleet was being read, so concurrent car writes are not lost. The
+    aggregates are marked built for FACETS_REBUILD_INTERVAL seconds only: the next read after
+    that rebuilds them, so any drift heals itself. If another worker is already rebuilding, the
+    counts are answered from the database and the aggregates are left to it.
+    """
+    token = secrets.token_hex(8)
+    if not redis_client.set(FACETS_REBUILD_LOCK, token, nx=True, px=FACETS_REBUILD_TIMEOUT_MS):
+        return fold_facet_rows(grouped_facet_rows(db.query(Car)))
+    redis_client.delete(*(_journal_key(name) for name in FACET_NAMES), *(_building_key(name) for name in FACET_NAMES))
+    facets = fold_facet_rows(grouped_facet_rows(db.query(Car)))
+    with redis_client.pipeline(transaction=False) as pipe:
+        for name in FACET_NAMES:
+            if facets[name]:
+                pipe.hset(_building_key(name), mapping=facets[name])
+                pipe.pexpire(_building_key(name), FACETS_REBUILD_TIMEOUT_MS)
+        pipe.execute()
+    FINISH_REBUILD_SCRIPT(keys=FINISH_KEYS, args=[token, settings.FACETS_REBUILD_INTERVAL])
+    return facets
+
+
+def _delta_args(delta: Counter) -> list:
+    return [item for (name, value), count in delta.items() for item in (FACET_NAMES.index(name) + 1, value, count)]
+
+
+def apply_facet_delta(delta: Counter) -> None:
+    if not delta:
+        return
+    APPLY_DELTA(keys=DELTA_KEYS, args=_delta_args(delta))
+
+
+async def apply_facet_delta_async(delta: Counter) -> None:
+    if not delta:
+        return
+    redis = await get_redis()
+    await redis.register_script(APPLY_DELTA_SCRIPT)(keys=DELTA_KEYS, args=_delta_args(delta))
+
+
+async def get_facets_async(db: Session) -> dict:
+    """
+    Return fleet-wide facet counts from the incrementally maintained Redis aggregates.
+
+    The aggregates are rebuilt from the database the first time they are read (or after Redis
+    lost them), in the threadpool; from then on car writes keep them current with HINCRBY deltas.
+    """
+    redis = await get_redis()
+    async with redis.pipeline(transaction=False) as pipe:
+        pipe.exists(FACETS_BUILT_KEY)
+        for name in FACET_NAMES:
+            pipe.hgetall(_facet_key(name))
+        built, *raw = await pipe.execute()
+    if not built:
+        return await run_in_threadpool(rebuild_facets, db)
+    return _facet_hashes(raw)
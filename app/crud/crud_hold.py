@@ -0,0 +1,122 @@
+import json
+import secrets
+import time
+from datetime import datetime, timezone
+from typing import Dict, List, Optional
+
+from app.core.app_settings import settings
+from app.core.redis_config import redis_client
+
+HOLD_KEY_PREFIX = "hold"
+
+# Holds of a car live in one sorted set scored by expiry, so expired holds are skipped by a
+# score range and the set itself expires with its last hold; nothing is ever written to the DB.
+# Placing is one script so two checkouts can't both pass the overlap check for the same car.
+PLACE_HOLD_SCRIPT = redis_client.register_script("""
+local now, expires_at = tonumber(ARGV[1]), tonumber(ARGV[2])
+local hold = cjson.decode(ARGV[3])
+redis.call('ZREMRANGEBYSCORE', KEYS[1], '-inf', now)
+for _, member in ipairs(redis.call('ZRANGE', KEYS[1], 0, -1)) do
+    local other = cjson.decode(member)
+    if other['start'] < hold['end'] and other['end'] > hold['start'] then
+        return member
+    end
+end
+redis.call('ZADD', KEYS[1], expires_at, ARGV[3])
+local latest = redis.call('ZRANGE', KEYS[1], -1, -1, 'WITHSCORES')
+redis.call('EXPIREAT', KEYS[1], math.ceil(tonumber(latest[2])))
+return false
+""")
+
+# Holds are released by id rather than by re-serialising them, so the member removed is exactly
+# the one stored whatever JSON encoding produced it
+RELEASE_HOLD_SCRIPT = redis_client.register_script("""
+for _, member in ipairs(redis.call('ZRANGE', KEYS[1], 0, -1)) do
+    if cjson.decode(member)['id'] == ARGV[1] then
+        return redis.call('ZREM', KEYS[1], member)
+    end
+end
+return 0
+""")
+
+
+class HoldConflictError(Exception):
+    """Raised when a hold would overlap another live hold on the same car."""
+
+
+class InvalidHoldError(Exception):
+    """Raised when a booking refers to a hold that expired or does not cover it."""
+
+
+def _key(car_id: int) -> str:
+    return f"{HOLD_KEY_PREFIX}:{car_id}"
+
+
+def _timestamp(value: datetime) -> float:
+    if value.tzinfo is None:
+        value = value.replace(tzinfo=timezone.utc)
+    return value.timestamp()
+
+
+def place_hold(car_id: int, user_id: int, start_time: datetime, end_time: datetime,
+               ttl: Optional[int] = None) -> dict:
+    """Hold a car for `ttl` seconds (BOOKING_HOLD_TTL by default), raising HoldConflictError if it is held."""
+    ttl = ttl or settings.BOOKING_HOLD_TTL
+    now = time.time()
+    hold = {"id": f"{car_id}-{secrets.token_urlsafe(16)}", "car_id": car_id, "user_id": user_id,
+            "start": _timestamp(start_time), "end": _timestamp(end_time), "expires_at": now + ttl}
+    if PLACE_HOLD_SCRIPT(keys=[_key(car_id)], args=[now, hold["expires_at"], json.dumps(hold)]):
+        raise HoldConflictError(f"Car {car_id} is already held between {start_time} and {end_time}")
+    return hold
+
+
+def active_holds(car_ids: List[int]) -> Dict[int, List[dict]]:
+    """Return the live holds of each car, fetched in one round trip."""
+    now = time.time()
+    with redis_client.pipeline(transaction=False) as pipe:
+        for car_id in car_ids:
+            pipe.zrangebyscore(_key(car_id), now, "+inf")
+        members = pipe.execute()
+    return {car_id: [json.loads(member) for member in held] for car_id, held in zip(car_ids, members)}
+
+
+def describe_hold(hold: dict) -> dict:
+    """Render a stored hold with datetimes, as returned by the API."""
+    return {"id": hold["id"], "car_id": hold["car_id"], "user_id": hold["user_id"],
+            "start_time": datetime.fromtimestamp(hold["start"], timezone.utc),
+            "end_time": datetime.fromtimestamp(hold["end"], timezone.utc),
+            "expires_at": datetime.fromtimestamp(hold["expires_at"], timezone.utc)}
+
+
+def find_hold(holds: List[dict], hold_id: str) -> Optional[dict]:
+    return next((hold for hold in holds if hold["id"] == hold_id), None)
+
+
+def get_hold(hold_id: str) -> Optional[dict]:
+    """Look up a live hold by id; ids start with the car id, which locates the car's hold set."""
+    car_id, _, _ = hold_id.partition("-")
+    if not car_id.isdigit():
+        return None
+    return find_hold(active_holds([int(car_id)])[int(car_id)], hold_id)
+
+
+def check_holds(holds: List[dict], user_id: Optional[int], start_time: datetime, end_time: datetime,
+                hold_id: Optional[str] = None) -> Optional[dict]:
+    """
+    Check a booking period against the live holds of its car, returning the hold it redeems.
+
+    Raises InvalidHoldError if `hold_id` is gone, belongs to someone else or doesn't cover the
+    period, and HoldConflictError if the period overlaps any other hold.
+    """
+    start, end = _timestamp(start_time), _timestamp(end_time)
+    own = find_hold(holds, hold_id) if hold_id else None
+    if hold_id and (own is None or own["user_id"] != user_id or not own["start"] <= start < end <= own["end"]):
+        raise InvalidHoldError(f"Hold {hold_id} has expired or does not cover this booking")
+    for hold in holds:
+        if hold is not own and hold["start"] < end and hold["end"] > start:
+            raise HoldConflictError(f"Car {hold['car_id']} is held between {start_time} and {end_time}")
+    return own
+
+
+def release_hold(hold: dict) -> None:
+    RELEASE_HOLD_SCRIPT(keys=[_key(hold["car_id"])], args=[hold["id"]])
@@ -0,0 +1,161 @@
+from datetime import date, datetime, time, timedelta
+from typing import Dict, Iterable, List, Tuple
+
+from redis.exceptions import WatchError
+from sqlalchemy.orm import Session
+from starlette.concurrency import run_in_threadpool
+
+from app.core.redis_config import redis_client, get_redis
+from app.models.booking import Booking
+from app.models.model_enums import STATUS
+
+OCCUPANCY_KEY_PREFIX = "occupancy"
+OCCUPANCY_BUILT_KEY = f"{OCCUPANCY_KEY_PREFIX}:built"
+OCCUPANCY_BUILD_ATTEMPTS = 3
+
+# Bit N of a car's bitmap is the N-th day after EPOCH; days before it are not tracked
+EPOCH = date(2000, 1, 1)
+
+
+def _key(car_id: int) -> str:
+    return f"{OCCUPANCY_KEY_PREFIX}:{car_id}"
+
+
+def _version_key(car_id: int) -> str:
+    return f"{OCCUPANCY_KEY_PREFIX}:version:{car_id}"
+
+
+def _set_bits(pipe, car_id: int, bits: Iterable[Tuple[int, int]]) -> None:
+    # One BITFIELD per car sets every day of a range instead of a SETBIT round per day
+    bits = list(bits)
+    if bits:
+        operation = pipe.bitfield(_key(car_id))
+        for offset, value in bits:
+            operation.set("u1", offset, value)
+        operation.execute()
+
+
+def _offset(day: date) -> int:
+    return (day - EPOCH).days
+
+
+def day_span(start_time: datetime, end_time: datetime) -> Tuple[date, date]:
+    """Return the first and last calendar day touched by a [start_time, end_time) booking."""
+    return start_time.date(), (end_time - timedelta(microseconds=1)).date()
+
+
+def _active_bookings(db: Session, car_ids: List[int], first_day: date = None, last_day: date = None):
+    query = db.query(Booking.car_id, Booking.start_time, Booking.end_time).filter(
+        Booking.car_id.in_(car_ids), Booking.status != STATUS.CANCELLED.value)
+    if first_day is not None:
+        query = query.filter(Booking.start_time < datetime.combine(last_day + timedelta(days=1), time.min),
+                             Booking.end_time > datetime.combine(first_day, time.min))
+    return query
+
+
+def _occupied_offsets(rows: Iterable, first_day: date = EPOCH, last_day: date = date.max) -> Dict[int, set]:
+    occupied = {}
+    for car_id, start_time, end_time in rows:
+        start_day, end_day = day_span(start_time, end_time)
+        start_day, end_day = max(start_day, first_day), min(end_day, last_day)
+        occupied.setdefault(car_id, set()).update(range(_offset(start_day), _offset(end_day) + 1))
+    return occupied
+
+
+def build_occupancy(db: Session, car_ids: List[int]) -> None:
+    """
+    Rebuild the day bitmaps of `car_ids` from their full booking history.
+
+    Every booking write bumps its car's version counter before checking whether the car is
+    built, so the cars' versions are watched across the read: if a booking lands after the
+    history was read but before the bitmaps are stored, the write is retried from a fresh read
+    rather than storing a bitmap that misses it. Cars left unbuilt are retried on the next read.
+    """
+    for _ in range(OCCUPANCY_BUILD_ATTEMPTS):
+        with redis_client.pipeline(transaction=True) as pipe:
+            try:
+                pipe.watch(*(_version_key(car_id) for car_id in car_ids))
+                occupied = _occupied_offsets(_active_bookings(db, car_ids))
+                pipe.multi()
+                for car_id in car_ids:
+                    pipe.delete(_key(car_id))
+                    _set_bits(pipe, car_id, ((offset, 1) for offset in occupied.get(car_id, ())))
+                pipe.sadd(OCCUPANCY_BUILT_KEY, *car_ids)
+                pipe.execute()
+                return
+            except WatchError:
+                continue
+
+
+def drop_occupancy(car_ids: List[int]) -> None:
+    """Forget the bitmaps of `car_ids` so the next read rebuilds them from the bookings table."""
+    if not car_ids:
+        return
+    with redis_client.pipeline(transaction=True) as pipe:
+        for car_id in car_ids:
+            pipe.incr(_version_key(car_id))  # Abandons a build that read the history before the change
+        pipe.srem(OCCUPANCY_BUILT_KEY, *car_ids)
+        pipe.delete(*(_key(car_id) for car_id in car_ids))
+        pipe.execute()
+
+
+def refresh_occupancy(db: Session, car_id: int, start_time: datetime, end_time: datetime) -> None:
+    """
+    Recompute the bits of the days a booking touched after it was created, moved or removed.
+
+    Days are recomputed from every active booking of the car on them rather than flipped, so a
+    day shared by two bookings stays occupied when only one of them goes away. Cars whose bitmap
+    has not been built yet are skipped; the version bump makes a build in progress start over,
+    and the first read builds them from scratch.
+    """
+    with redis_client.pipeline(transaction=True) as pipe:
+        pipe.incr(_version_key(car_id))
+        pipe.sismember(OCCUPANCY_BUILT_KEY, car_id)
+        _, built = pipe.execute()
+    if not built:
+        return
+    first_day, last_day = day_span(start_time, end_time)
+    first_day = max(first_day, EPOCH)
+    if last_day < first_day:
+        return
+    occupied = _occupied_offsets(_active_bookings(db, [car_id], first_day, last_day), first_day, last_day)
+    occupied = occupied.get(car_id, set())
+    with redis_client.pipeline(transaction=True) as pipe:
+        _set_bits(pipe, car_id, ((offset, 1 if offset in occupied else 0)
+                                 for offset in range(_offset(first_day), _offset(last_day) + 1)))
+        pipe.execute()
+
+
+async def get_occupancy_async(db: Session, car_ids: List[int], start: date, end: date) -> Dict[int, List[date]]:
+    """
+    Return the booked days between `start` and `end` (inclusive) for each car, read from the day bitmaps.
+
+    Cars without a bitmap yet are built from the database first, in the threadpool.
+    """
+    redis = await get_redis()
+    built = await redis.smismember(OCCUPANCY_BUILT_KEY, car_ids)
+    missing = [car_id for car_id, is_built in zip(car_ids, built) if not is_built]
+    if missing:
+        await run_in_threadpool(build_occupancy, db, missing)
+
+    start, end = max(start, EPOCH), max(end, EPOCH)
+    first_offset, last_offset = _offset(start), _offset(end)
+    first_byte = first_offset // 8
+    async with redis.pipeline(transaction=False) as pipe:
+        for car_id in car_ids:
+            pipe.getrange(_key(car_id), first_byte, last_offset // 8)
+        bitmaps = await pipe.execute()
+
+    calendar = {}
+    for car_id, bitmap in zip(car_ids, bitmaps):
+        days = []
+        for index, byte in enumerate(bitmap):
+            if not byte:
+                continue
+            for bit in range(8):
+                # Redis numbers bits from the most significant bit of each byte
+                offset = (first_byte + index) * 8 + bit
+                if byte & (0x80 >> bit) and first_offset <= offset <= last_offset:
+                    days.append(EPOCH + timedelta(days=offset))
+        calendar[car_id] = days
+    return calendar
@@ -0,0 +1,190 @@
+import json
+import secrets
+from datetime import datetime
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from sqlalchemy import insert, select
+from sqlalchemy.orm import Session
+from starlette.concurrency import run_in_threadpool
+
+from app.core.redis_config import redis_client, get_redis
+from app.models.car import Car
+from app.models.price_history import PriceHistory
+from app.utils.cache import LOCK_PREFIX, get_cache, set_cache, namespaced_key
+
+PRICING_CACHE_NAMESPACE = "pricing"
+PRICE_SNAPSHOT_KEY = "car_prices"
+PRICE_BUILDING_KEY = f"{PRICE_SNAPSHOT_KEY}:building"
+PRICE_JOURNAL_KEY = f"{PRICE_SNAPSHOT_KEY}:journal"
+PRICE_REBUILD_LOCK = f"{LOCK_PREFIX}:{PRICE_SNAPSHOT_KEY}"
+SNAPSHOT_BATCH_SIZE = 1000
+# Longest a rebuild may hold the lock; its building and journal keys expire with it if the worker dies
+SNAPSHOT_REBUILD_TIMEOUT_MS = 600_000
+
+PUBLISH_KEYS = [PRICE_SNAPSHOT_KEY, PRICE_JOURNAL_KEY, PRICE_REBUILD_LOCK]
+FINISH_KEYS = [PRICE_BUILDING_KEY, PRICE_SNAPSHOT_KEY, PRICE_JOURNAL_KEY, PRICE_REBUILD_LOCK]
+
+# Price writes go to the live snapshot and, while a rebuild holds the lock, to its journal as well,
+# in one script so a rebuild can't finish between the two. An empty entry marks a deleted car.
+PUBLISH_PRICES_SCRIPT = redis_client.register_script("""
+local rebuilding = redis.call('PTTL', KEYS[3])
+local live = redis.call('EXISTS', KEYS[1]) == 1
+for i = 1, #ARGV, 2 do
+    if rebuilding > 0 then
+        redis.call('HSET', KEYS[2], ARGV[i], ARGV[i + 1])
+    end
+    if live then
+        if ARGV[i + 1] == '' then
+            redis.call('HDEL', KEYS[1], ARGV[i])
+        else
+            redis.call('HSET', KEYS[1], ARGV[i], ARGV[i + 1])
+        end
+    end
+end
+if rebuilding > 0 then
+    redis.call('PEXPIRE', KEYS[2], rebuilding)
+end
+""")
+
+# Replays the writes journaled since the rebuild started reading onto the rebuilt hash, then swaps
+# it in. Does nothing if the lock lapsed, leaving the building key to expire.
+FINISH_SNAPSHOT_SCRIPT = redis_client.register_script("""
+if redis.call('GET', KEYS[4]) ~= ARGV[1] then
+    return 0
+end
+local entries = redis.call('HGETALL', KEYS[3])
+for i = 1, #entries, 2 do
+    if entries[i + 1] == '' then
+        redis.call('HDEL', KEYS[1], entries[i])
+    else
+        redis.call('HSET', KEYS[1], entries[i], entries[i + 1])
+    end
+end
+if redis.call('EXISTS', KEYS[1]) == 1 then
+    redis.call('RENAME', KEYS[1], KEYS[2])
+    redis.call('PERSIST', KEYS[2])
+else
+    redis.call('DEL', KEYS[2])
+end
+redis.call('DEL', KEYS[3], KEYS[4])
+return 1
+""")
+
+
+def _point(row: Optional[PriceHistory]) -> Optional[dict]:
+    return {"effective_from": row.effective_from, "price": row.price} if row else None
+
+
+def record_prices(db: Session, prices: Iterable[Tuple[int, float]], effective_from: Optional[datetime] = None):
+    """
+    Append a history row per (car_id, price), effective now unless `effective_from` is given.
+
+    Nothing is committed here, so the history lands in the same transaction as the price change.
+    """
+    effective_from = effective_from or datetime.utcnow()
+    rows = [{"car_id": car_id, "effective_from": effective_from, "price": round(price, 2)} for car_id, price in prices]
+    if rows:
+        db.execute(insert(PriceHistory), rows)
+
+
+def price_at(db: Session, car_id: int, at: datetime) -> Optional[dict]:
+    """Price of a car in effect at `at`: one index seek backwards from `at`."""
+    row = (db.query(PriceHistory)
+           .filter(PriceHistory.car_id == car_id, PriceHistory.effective_from <= at)
+           .order_by(PriceHistory.effective_from.desc())
+           .first())
+    return _point(row)
+
+
+def price_series(db: Session, car_id: int, start: datetime, end: datetime) -> List[dict]:
+    """
+    Prices of a car over [start, end]: the price in effect at `start` followed by every change
+    up to `end`, read as one index range scan.
+    """
+    changes = (db.query(PriceHistory)
+               .filter(PriceHistory.car_id == car_id, PriceHistory.effective_from > start,
+                       PriceHistory.effective_from <= end)
+               .order_by(PriceHistory.effective_from)
+               .all())
+    first = price_at(db, car_id, start)
+    return ([first] if first else []) + [_point(row) for row in changes]
+
+
+def get_current_price(db: Session, car_id: int) -> Optional[dict]:
+    """Latest price of a car, cached until the next pricing change."""
+    cache_key = namespaced_key(PRICING_CACHE_NAMESPACE, f"current_price:{car_id}")
+    cached = get_cache(cache_key)
+    if cached:
+        return {"effective_from": datetime.fromisoformat(cached["effective_from"]), "price": cached["price"]}
+
+    point = price_at(db, car_id, datetime.max)
+    if point:
+        set_cache(cache_key, {"effective_from": point["effective_from"].isoformat(), "price": point["price"]})
+    return point
+
+
+def _snapshot_entry(daily_rate: float, surge_multiplier: float) -> str:
+    return json.dumps({"surge_price": round(daily_rate * surge_multiplier, 2), "surge_multiplier": surge_multiplier})
+
+
+def refresh_price_snapshot(db: Session) -> Optional[int]:
+    """
+    Rebuild the Redis hash holding every car's current price, returning how many cars it holds.
+
+    The hash is built under a temporary key and renamed over the live one, so readers never
+    see it half-built and cars deleted since the last build drop out. Price writes published
+    while the fleet is being read are journaled and replayed onto the new hash before the
+    rename, so a change committed mid-rebuild isn't overwritten by the older value. Returns
+    None without touching the snapshot if another worker is already rebuilding it.
+    """
+    token = secrets.token_hex(8)
+    if not redis_client.set(PRICE_REBUILD_LOCK, token, nx=True, px=SNAPSHOT_REBUILD_TIMEOUT_MS):
+        return None
+    redis_client.delete(PRICE_BUILDING_KEY, PRICE_JOURNAL_KEY)
+    count = 0
+    rows = db.execute(select(Car.id, Car.daily_rate, Car.surge_multiplier)
+                      .execution_options(yield_per=SNAPSHOT_BATCH_SIZE))
+    with redis_client.pipeline(transaction=False) as pipe:
+        for batch in rows.partitions():
+            pipe.hset(PRICE_BUILDING_KEY, mapping={car_id: _snapshot_entry(daily_rate, surge_multiplier)
+                                                   for car_id, daily_rate, surge_multiplier in batch})
+            pipe.pexpire(PRICE_BUILDING_KEY, SNAPSHOT_REBUILD_TIMEOUT_MS)
+            count += len(batch)
+        pipe.execute()
+    FINISH_SNAPSHOT_SCRIPT(keys=FINISH_KEYS, args=[token])
+    return count
+
+
+def _publish(entries: Dict[int, str]) -> None:
+    if entries:
+        args = [item for car_id, entry in entries.items() for item in (car_id, entry)]
+        PUBLISH_PRICES_SCRIPT(keys=PUBLISH_KEYS, args=args)
+
+
+def publish_prices(rows: Iterable[Tuple[int, float, float]]) -> None:
+    """
+    Write the (car_id, daily_rate, surge_multiplier) of changed cars into the snapshot.
+
+    Call after the change is committed. A snapshot that hasn't been built yet is left alone;
+    the first read builds it whole.
+    """
+    _publish({car_id: _snapshot_entry(daily_rate, surge_multiplier)
+              for car_id, daily_rate, surge_multiplier in rows})
+
+
+def drop_prices(car_ids: List[int]) -> None:
+    _publish({car_id: "" for car_id in car_ids})
+
+
+async def read_prices_async(db: Session, car_ids: List[int]) -> Dict[int, dict]:
+    """
+    Current pricing of each car with one HMGET; cars that don't exist are left out.
+
+    Only a missing snapshot touches the database, and that one rebuild runs in the threadpool.
+    """
+    redis = await get_redis()
+    values = await redis.hmget(PRICE_SNAPSHOT_KEY, car_ids)
+    if not any(values) and not await redis.exists(PRICE_SNAPSHOT_KEY):
+        await run_in_threadpool(refresh_price_snapshot, db)
+        values = await redis.hmget(PRICE_SNAPSHOT_KEY, car_ids)
+    return {car_id: {"car_id": car_id, **json.loads(value)} for car_id, value in zip(car_ids, values) if value}
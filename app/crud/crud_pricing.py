@@ -1,26 +1,61 @@
 import logging
+import math
+import threading
+from datetime import date, datetime, timedelta
+from typing import Dict, List, Optional
 
+import numpy as np
+from sqlalchemy import Float, Integer, bindparam, column, select, update, values
 from sqlalchemy.exc import SQLAlchemyError
 from sqlalchemy.orm import Session
 
+from app.core.app_settings import settings
+from app.crud import crud_facets
+from app.crud.crud_car import CARS_CACHE_NAMESPACE
+from app.crud.crud_price_history import PRICING_CACHE_NAMESPACE, record_prices, publish_prices, read_prices_async
+from app.models.booking import Booking
 from app.models.car import Car
-from app.schemas.pricing import PricingCreate, PricingUpdate
+from app.models.model_enums import STATUS, VehicleType
+from app.schemas.pricing import PricingCreate, PricingUpdate, PricingBulkUpdate
+from app.utils.cache import get_namespace_version, invalidate_namespace, delete_many_cache
+from app.utils.surge import fleet_demand, surge_multipliers
 
 # Configure logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+# Quote rules applied on top of each car's daily rate, per rental day
+WEEKEND_MULTIPLIER = 1.2
+SEASONAL_MULTIPLIERS = {6: 1.15, 7: 1.25, 8: 1.25, 12: 1.15}
 
-def get_car_pricing(db: Session, car_id: int):
-    try:
-        car = db.query(Car).filter(Car.id == car_id).first()
-        if not car:
-            logger.warning(f"Car with id {car_id} not found.")
-            return None
-        return car.base_price
-    except SQLAlchemyError as e:
-        logger.error(f"Database error occurred: {e}")
+# (version, rates), swapped in as one tuple so a lock-free reader never pairs a version with other rates
+rate_table = (None, {})
+rate_table_lock = threading.Lock()
+
+
+def _pricing(car: Car) -> dict:
+    return {"car_id": car.id, "surge_price": round(car.daily_rate * car.surge_multiplier, 2),
+            "surge_multiplier": car.surge_multiplier}
+
+
+def _set_surge_price(car: Car, surge_price: float):
+    # The daily rate stays the base price; a manual surge price is kept as its multiplier, which
+    # only lasts until the next recompute_surge run replaces it with the demand-driven one
+    car.surge_multiplier = surge_price / car.daily_rate
+
+
+async def get_prices_async(db: Session, car_ids: List[int]) -> List[dict]:
+    """Current pricing of several cars, served from the Redis price snapshot."""
+    prices = await read_prices_async(db, car_ids)
+    return [prices[car_id] for car_id in car_ids if car_id in prices]
+
+
+async def get_car_pricing_async(db: Session, car_id: int):
+    prices = await read_prices_async(db, [car_id])
+    if car_id not in prices:
+        logger.warning(f"Car with id {car_id} not found.")
         return None
+    return prices[car_id]
 
 
 def create_pricing(db: Session, pricing: PricingCreate):
@@ -29,16 +64,19 @@ def create_pricing(db: Session, pricing: PricingCreate):
         if not car:
             logger.warning(f"Car with id {pricing.car_id} not found.")
             return None
-        car.base_price = pricing.surge_price
+        _set_surge_price(car, pricing.surge_price)
         db.add(car)
+        record_prices(db, [(car.id, pricing.surge_price)])
         db.commit()
         db.refresh(car)
+        invalidate_namespace(PRICING_CACHE_NAMESPACE)
+        publish_prices([(car.id, car.daily_rate, car.surge_multiplier)])
         logger.info(f"Pricing created for car id {car.id}.")
-        return car
+        return _pricing(car)
     except SQLAlchemyError as e:
         logger.error(f"Database error occurred: {e}")
         db.rollback()
-        return None
+        raise
 
 
 def update_pricing(db: Session, car_id: int, pricing: PricingUpdate):
@@ -47,12 +85,171 @@ def update_pricing(db: Session, car_id: int, pricing: PricingUpdate):
         if not car:
             logger.warning(f"Car with id {car_id} not found.")
             return None
-        car.base_price = pricing.surge_price
+        _set_surge_price(car, pricing.surge_price)
+        record_prices(db, [(car.id, pricing.surge_price)])
         db.commit()
         db.refresh(car)
+        invalidate_namespace(PRICING_CACHE_NAMESPACE)
+        publish_prices([(car.id, car.daily_rate, car.surge_multiplier)])
         logger.info(f"Pricing updated for car id {car.id}.")
-        return car
+        return _pricing(car)
     except SQLAlchemyError as e:
         logger.error(f"Database error occurred: {e}")
         db.rollback()
-        return None
+        raise
+
+
+def bulk_update_prices(db: Session, changes: PricingBulkUpdate) -> int:
+    """
+    Set or adjust the daily rate of many cars in one set-based UPDATE, returning how many changed.
+
+    Explicit rates are joined in from a VALUES list; adjustments scale every car matching the
+    predicate. The surge multiplier keeps applying on top. Car, search, facet and price caches
+    are refreshed once for the whole change.
+    """
+    if changes.prices and db.get_bind().dialect.name != "postgresql":
+        return _update_prices_by_id(db, {price.car_id: price.daily_rate for price in changes.prices})
+    if changes.prices:
+        rates = {price.car_id: price.daily_rate for price in changes.prices}
+        new_rates = values(column("id", Integer), column("daily_rate", Float), name="new_rates")
+        new_rates = new_rates.data(list(rates.items()))
+        statement = update(Car).where(Car.id == new_rates.c.id).values(daily_rate=new_rates.c.daily_rate)
+    else:
+        adjustment = changes.adjustment
+        statement = update(Car).values(daily_rate=Car.daily_rate * (1 + adjustment.percent / 100))
+        if adjustment.vehicle_type is not None:
+            statement = statement.where(Car.vehicle_type == VehicleType(adjustment.vehicle_type.value))
+        if adjustment.branch_id is not None:
+            statement = statement.where(Car.branch_id == adjustment.branch_id)
+        if adjustment.location is not None:
+            statement = statement.where(Car.location == adjustment.location)
+
+    try:
+        rows = db.execute(statement.returning(Car.id, Car.daily_rate, Car.surge_multiplier)
+                          .execution_options(synchronize_session=False)).all()
+        record_prices(db, [(car_id, daily_rate * surge_multiplier) for car_id, daily_rate, surge_multiplier in rows])
+        db.commit()
+    except SQLAlchemyError as e:
+        logger.error(f"Database error occurred: {e}")
+        db.rollback()
+        raise
+    return _after_bulk_update(db, rows)
+
+
+def _update_prices_by_id(db: Session, rates: Dict[int, float]) -> int:
+    # Dialects without UPDATE ... FROM VALUES get one executemany keyed by id, then read back what changed
+    cars = Car.__table__
+    statement = update(cars).where(cars.c.id == bindparam("car_id")).values(daily_rate=bindparam("new_rate"))
+    try:
+        db.execute(statement, [{"car_id": car_id, "new_rate": rate} for car_id, rate in rates.items()])
+        rows = db.execute(select(Car.id, Car.daily_rate, Car.surge_multiplier).where(Car.id.in_(rates))).all()
+        record_prices(db, [(car_id, daily_rate * surge_multiplier) for car_id, daily_rate, surge_multiplier in rows])
+        db.commit()
+    except SQLAlchemyError as e:
+        logger.error(f"Database error occurred: {e}")
+        db.rollback()
+        raise
+    return _after_bulk_update(db, rows)
+
+
+def _after_bulk_update(db: Session, rows) -> int:
+    if rows:
+        delete_many_cache([f"car_{car_id}" for car_id, _, _ in rows])
+        invalidate_namespace(CARS_CACHE_NAMESPACE)
+        invalidate_namespace(PRICING_CACHE_NAMESPACE)
+        publish_prices(rows)
+        crud_facets.rebuild_facets(db)
+    logger.info(f"Bulk pricing update changed {len(rows)} cars.")
+    return len(rows)
+
+
+def _epoch_seconds(values) -> np.ndarray:
+    return np.array(values, dtype="datetime64[s]").astype(np.int64)
+
+
+def recompute_surge(db: Session, now: Optional[datetime] = None,
+                    horizon_days: int = settings.PRICING_HORIZON_DAYS) -> int:
+    """
+    Recompute the surge multiplier of every car in one batch, returning how many changed.
+
+    Fleet and upcoming bookings are read as flat columns, the multipliers are computed with
+    vectorized math over the whole fleet, and only the cars whose multiplier moved are written
+    back, in a single executemany UPDATE. Multipliers set by hand through create_pricing or
+    update_pricing are overwritten too: manual surge lasts until the next run. Lasting price
+    changes go through the daily rate (bulk_update_prices), which surge applies on top of.
+    """
+    now = now or datetime.utcnow()
+    cars = db.execute(select(Car.id, Car.vehicle_type, Car.branch_id, Car.daily_rate, Car.surge_multiplier)
+                      .order_by(Car.id)).all()
+    if not cars:
+        return 0
+    car_ids, vehicle_types, branch_ids, daily_rates, current = zip(*cars)
+    car_ids = np.array(car_ids)
+    _, type_codes = np.unique([vehicle_type.value for vehicle_type in vehicle_types], return_inverse=True)
+    _, branch_codes = np.unique(branch_ids, return_inverse=True)
+
+    bookings = db.execute(select(Booking.car_id, Booking.start_time, Booking.end_time).where(
+        Booking.end_time > now, Booking.start_time < now + timedelta(days=horizon_days),
+        Booking.status != STATUS.CANCELLED.value)).all()
+    booking_car_ids, starts, ends = zip(*bookings) if bookings else ((), (), ())
+    occupancy, lead_days = fleet_demand(car_ids, np.array(booking_car_ids, dtype=np.int64), _epoch_seconds(starts),
+                                        _epoch_seconds(ends), int(_epoch_seconds([now])[0]), horizon_days)
+
+    multipliers = surge_multipliers(occupancy, lead_days, type_codes, branch_codes, horizon_days)
+    changed = np.flatnonzero(multipliers != np.array(current, dtype=float))
+    if len(changed):
+        db.execute(update(Car), [{"id": int(car_ids[i]), "surge_multiplier": float(multipliers[i])} for i in changed])
+        record_prices(db, [(int(car_ids[i]), daily_rates[i] * float(multipliers[i])) for i in changed], now)
+        db.commit()
+        invalidate_namespace(PRICING_CACHE_NAMESPACE)
+        publish_prices((int(car_ids[i]), daily_rates[i], float(multipliers[i])) for i in changed)
+    logger.info(f"Recomputed surge for {len(car_ids)} cars, {len(changed)} changed.")
+    return len(changed)
+
+
+def get_rate_table(db: Session) -> Dict[int, float]:
+    """
+    Effective daily rate of every car, compiled once and kept in this worker's memory.
+
+    The table is tagged with the cars and pricing namespace versions it was built from and is
+    recompiled in one query when either moves, which any car or pricing write triggers.
+    """
+    global rate_table
+    version = (get_namespace_version(CARS_CACHE_NAMESPACE), get_namespace_version(PRICING_CACHE_NAMESPACE))
+    built_version, rates = rate_table
+    if built_version != version:
+        with rate_table_lock:
+            built_version, rates = rate_table
+            if built_version != version:
+                rows = db.execute(select(Car.id, Car.daily_rate, Car.surge_multiplier)).all()
+                rates = {car_id: daily_rate * surge_multiplier for car_id, daily_rate, surge_multiplier in rows}
+                rate_table = (version, rates)
+    return rates
+
+
+def rental_days(start_time: datetime, end_time: datetime) -> List[date]:
+    """Days charged for a rental: one per started 24 hours, dated by when that period begins."""
+    periods = math.ceil((end_time - start_time) / timedelta(days=1))
+    return [(start_time + timedelta(days=day)).date() for day in range(periods)]
+
+
+def day_multiplier(day: date) -> float:
+    multiplier = SEASONAL_MULTIPLIERS.get(day.month, 1.0)
+    if day.weekday() >= 5:
+        multiplier *= WEEKEND_MULTIPLIER
+    return multiplier
+
+
+def quote_rentals(db: Session, car_ids: List[int], start_time: datetime, end_time: datetime) -> List[dict]:
+    """
+    Quote renting each car over [start_time, end_time); cars that don't exist are left out.
+
+    The weekday, weekend and seasonal rules depend only on the dates, so they are folded into
+    one factor shared by every car and each quote is a single multiplication.
+    """
+    rates = get_rate_table(db)
+    days = rental_days(start_time, end_time)
+    factor = sum(day_multiplier(day) for day in days)
+    return [{"car_id": car_id, "days": len(days), "daily_rate": round(rates[car_id], 2),
+             "total": round(rates[car_id] * factor, 2)}
+            for car_id in car_ids if car_id in rates]
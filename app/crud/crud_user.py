@@ -1,8 +1,19 @@
+from typing import Optional
+
 from sqlalchemy.orm import Session
 
-from app.core.security import verify_password, get_password_hash
+from app.core.app_settings import settings
+from app.core.security import get_password_hash, get_password_hash_async
 from app.models.user import User
-from app.schemas.user import UserCreate, UserUpdate
+from app.schemas.user import UserCreate, UserUpdate, UserInDB
+from app.utils.cache import get_cache, set_cache, delete_cache
+from app.utils.pagination import paginate
+
+PRINCIPAL_CACHE_PREFIX = "principal"
+
+
+def _principal_key(username: str) -> str:
+    return f"{PRINCIPAL_CACHE_PREFIX}:{username}"
 
 
 def get_user(db: Session, user_id: int):
@@ -13,8 +24,31 @@ def get_user_by_email(db: Session, email: str):
     return db.query(User).filter(User.email == email).first()
 
 
-def get_users(db: Session, skip: int = 0, limit: int = 10):
-    return db.query(User).offset(skip).limit(limit).all()
+def get_principal(db: Session, username: str) -> Optional[UserInDB]:
+    """
+    The authenticated user behind a token subject, cached for PRINCIPAL_CACHE_TTL seconds.
+
+    update_user and delete_user evict the entry, so role and activation changes apply at once.
+    """
+    cache_key = _principal_key(username)
+    cached_user = get_cache(cache_key)
+    if cached_user:
+        return UserInDB(**cached_user)
+
+    db_user = db.query(User).filter(User.username == username).first()
+    if db_user is None:
+        return None
+    principal = UserInDB.from_orm(db_user)
+    set_cache(cache_key, principal.dict(), settings.PRINCIPAL_CACHE_TTL)
+    return principal
+
+
+def invalidate_principal(username: str):
+    delete_cache(_principal_key(username))
+
+
+def get_users(db: Session, skip: int = 0, limit: int = 10, after_id: Optional[int] = None):
+    return paginate(db.query(User), User.id, skip, limit, after_id).all()
 
 
 def create_user(db: Session, user: UserCreate):
@@ -33,24 +67,36 @@ def create_user(db: Session, user: UserCreate):
     return db_user
 
 
-def verify_user_password(user: User, password: str) -> bool:
-    return verify_password(password, user.hashed_password)
+def update_password_hash(db: Session, db_user: User, hashed_password: str):
+    db_user.hashed_password = hashed_password
+    db.commit()
 
 
-def update_user(db: Session, user_id: int, user: UserUpdate):
+def _update_user(db: Session, user_id: int, user: UserUpdate, hashed_password: Optional[str]):
     db_user = db.query(User).filter(User.id == user_id).first()
     if db_user:
-        if user.password:
-            db_user.hashed_password = get_password_hash(user.password)
+        if hashed_password:
+            db_user.hashed_password = hashed_password
         db_user.role = user.role
         db.commit()
         db.refresh(db_user)
+        invalidate_principal(db_user.username)
     return db_user
 
 
+def update_user(db: Session, user_id: int, user: UserUpdate):
+    return _update_user(db, user_id, user, get_password_hash(user.password) if user.password else None)
+
+
+async def update_user_async(db: Session, user_id: int, user: UserUpdate):
+    hashed_password = await get_password_hash_async(user.password) if user.password else None
+    return _update_user(db, user_id, user, hashed_password)
+
+
 def delete_user(db: Session, user_id: int):
     db_user = db.query(User).filter(User.id == user_id).first()
     if db_user:
         db.delete(db_user)
         db.commit()
+        invalidate_principal(db_user.username)
     return db_user
@@ -1,5 +1,6 @@
 from app.models.user import User
 from app.models.car import Car
-from app.models.booking import Booking
+from app.models.booking import Booking, BookingArchive
 from app.models.payments import Payment
+from app.models.price_history import PriceHistory
 from app.models.message import Message
@@ -9,7 +9,11 @@ from app.core.app_config import log_settings, log_router, log_database_tables
 from app.core.exception_handlers import custom_exception_handler
 from app.core.middlewares import init_middlewares
 from app.core.redis_config import init_redis, get_redis, close_redis
+from app.core.security import shutdown_password_executor
 from app.db.session import engine, Base
+from app.services.pricing_service import start_pricing_scheduler, stop_pricing_scheduler
+from app.services.qr_service import shutdown_qr_executor
+from app.utils.cache import start_invalidation_listener, stop_invalidation_listener, get_cache_stats
 
 # Configure logging
 logging.basicConfig(level=logging.INFO)
@@ -50,10 +54,12 @@ async def on_startup():
         spinner.next()
         await init_redis()
         logger.info("Redis initialized successfully.")
+        start_invalidation_listener()
         spinner.next()
         Base.metadata.create_all(bind=engine)
         log_database_tables()
         logger.info("All tables created successfully.")
+        start_pricing_scheduler()
         spinner.next()
         log_settings()
         logger.info("Application settings logged successfully.")
@@ -69,6 +75,10 @@ async def on_startup():
 @app.on_event("shutdown")
 async def on_shutdown():
     try:
+        stop_invalidation_listener()
+        stop_pricing_scheduler()
+        shutdown_qr_executor()
+        shutdown_password_executor()
         await close_redis()
         logger.info("Redis connection closed successfully.")
     except Exception as e:
@@ -93,6 +103,11 @@ async def redis():
     return {"status": "ok", "redis": str(redis_health)}
 
 
+@app.get("/cache", tags=["🏥 Health"])
+async def cache_stats():
+    return {"status": "ok", "cache": get_cache_stats()}
+
+
 app.include_router(auth.router, prefix="/api/v1/auth", tags=["🔐 Authentication 🔑"])
 app.include_router(cars.router, prefix="/api/v1/cars", tags=["🚗 Cars 🚙"])
 app.include_router(bookings.router, prefix="/api/v1/bookings", tags=["📅 Bookings 📆"])
@@ -1,14 +1,16 @@
 # app/models/booking.py
 
-from sqlalchemy import Column, Integer, String, ForeignKey, DateTime, Float
+from sqlalchemy import Column, Integer, String, ForeignKey, DateTime, Float, Index, DDL, PrimaryKeyConstraint, event, \
+    func
+from sqlalchemy.dialects.postgresql import ExcludeConstraint
 from sqlalchemy.orm import relationship
 from app.db.session import Base
+from app.models.model_enums import STATUS
 from app.models.payments import Payment  # Ensure this import is present
 
 
 class Booking(Base):
     __tablename__ = "bookings"
-    __table_args__ = {'comment': 'Table to store booking information'}
 
     id = Column(Integer, primary_key=True, index=True)
     car_id = Column(Integer, ForeignKey("cars.id"), nullable=False)
@@ -16,15 +18,66 @@ class Booking(Base):
     start_time = Column(DateTime, nullable=False)
     end_time = Column(DateTime, nullable=False)
     price = Column(Float, nullable=False)
-    status = Column(String, nullable=False)
-    qr_code = Column(String, nullable=True)
+    status = Column(String, default=STATUS.PENDING.value, nullable=False)
+
+    __table_args__ = (
+        # No two active bookings of a car may overlap. The constraint's GiST index also serves
+        # overlap (&&) probes per car; it needs the btree_gist extension created below
+        ExcludeConstraint(
+            (car_id, "="), (func.tsrange(start_time, end_time), "&&"),
+            name="ex_bookings_car_period", using="gist", where=status != STATUS.CANCELLED.value,
+        ).ddl_if(dialect="postgresql"),
+        Index("ix_bookings_car_start_end", car_id, start_time, end_time),
+        {'comment': 'Table to store booking information'},
+    )
 
     car = relationship("Car", back_populates="bookings")
     user = relationship("User", back_populates="bookings")
-    payment = relationship("Payment", back_populates="booking", uselist=False)
+    payment = relationship("Payment", primaryjoin="Booking.id == foreign(Payment.booking_id)",
+                           back_populates="booking", uselist=False)
 
     def __repr__(self):
         return f"<Booking {self.id}>"
 
     def __str__(self):
         return self.__repr__()
+
+
+event.listen(
+    Booking.__table__,
+    "before_create",
+    DDL("CREATE EXTENSION IF NOT EXISTS btree_gist").execute_if(dialect="postgresql"),
+)
+
+
+class BookingArchive(Base):
+    """
+    Bookings that ended long ago, moved out of `bookings` by the archival job.
+
+    Range-partitioned by month of start_time on Postgres; partitions are created by the job as
+    it needs them. Keeping history here leaves `bookings`, its GiST exclusion constraint and
+    every active-booking query sized to live data only.
+    """
+    __tablename__ = "bookings_archive"
+
+    id = Column(Integer, nullable=False)
+    car_id = Column(Integer, nullable=False)
+    user_id = Column(Integer, nullable=False)
+    start_time = Column(DateTime, nullable=False)
+    end_time = Column(DateTime, nullable=False)
+    price = Column(Float, nullable=False)
+    status = Column(String, nullable=False)
+
+    __table_args__ = (
+        # The partition key has to be part of the primary key
+        PrimaryKeyConstraint(id, start_time),
+        Index("ix_bookings_archive_car_start", car_id, start_time),
+        Index("ix_bookings_archive_user_start", user_id, start_time),
+        {'comment': 'Archived booking history', 'postgresql_partition_by': 'RANGE (start_time)'},
+    )
+
+    def __repr__(self):
+        return f"<BookingArchive {self.id}>"
+
+    def __str__(self):
+        return self.__repr__()
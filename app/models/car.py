@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, Float, String, Boolean, Enum
+from sqlalchemy import Column, Integer, Float, String, Boolean, Enum, Index, DDL, event
 from sqlalchemy.orm import relationship
 
 from app.db.session import Base
@@ -7,15 +7,29 @@ from app.models.model_enums import VehicleType
 
 class Car(Base):
     __tablename__ = "cars"
-    __table_args__ = {'comment': 'Table to store car information'}
 
     id = Column(Integer, primary_key=True, index=True)
     model = Column(String, nullable=False)
     available = Column(Boolean, default=True)
     daily_rate = Column(Float, nullable=False)
+    surge_multiplier = Column(Float, nullable=False, default=1.0, server_default="1")
     vehicle_type = Column(Enum(VehicleType), nullable=False)
     location = Column(String, nullable=True)
     branch_id = Column(Integer, nullable=False)
+    latitude = Column(Float, nullable=True)
+    longitude = Column(Float, nullable=True)
+    geohash = Column(String(12), nullable=True)
+
+    __table_args__ = (
+        # Trigram indexes serve both ILIKE '%x%' and fuzzy (%>) matches; need the pg_trgm extension created below
+        Index("ix_cars_model_trgm", model, postgresql_using="gin",
+              postgresql_ops={"model": "gin_trgm_ops"}).ddl_if(dialect="postgresql"),
+        Index("ix_cars_location_trgm", location, postgresql_using="gin",
+              postgresql_ops={"location": "gin_trgm_ops"}).ddl_if(dialect="postgresql"),
+        # Prefix index for geohash cell lookups (LIKE 'abc%')
+        Index("ix_cars_geohash", geohash, postgresql_ops={"geohash": "text_pattern_ops"}),
+        {'comment': 'Table to store car information'},
+    )
 
     bookings = relationship("Booking", back_populates="car")
 
@@ -24,3 +38,10 @@ class Car(Base):
 
     def __str__(self):
         return self.__repr__()
+
+
+event.listen(
+    Car.__table__,
+    "before_create",
+    DDL("CREATE EXTENSION IF NOT EXISTS pg_trgm").execute_if(dialect="postgresql"),
+)
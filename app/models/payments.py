@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, Enum, ForeignKey, Float
+from sqlalchemy import Column, Integer, String, Enum, Float
 from sqlalchemy.orm import relationship
 
 from app.db.session import Base
@@ -10,12 +10,14 @@ class Payment(Base):
     __table_args__ = {'comment': 'Table to store payment information'}
 
     id = Column(Integer, primary_key=True, index=True)
-    booking_id = Column(Integer, ForeignKey("bookings.id"), nullable=False, index=True)
+    # Not a foreign key: payments stay put when their booking is moved to bookings_archive
+    booking_id = Column(Integer, nullable=False, index=True)
     status = Column(Enum(STATUS), default=STATUS.PENDING, nullable=False)
     amount = Column(Float, nullable=False)
     reference = Column(String, nullable=True)
 
-    booking = relationship("Booking", back_populates="payment")
+    booking = relationship("Booking", primaryjoin="foreign(Payment.booking_id) == Booking.id",
+                           back_populates="payment")
 
     def __repr__(self):
         return f"<Payment {self.id}>"
@@ -0,0 +1,37 @@
+from datetime import datetime
+
+from sqlalchemy import Column, Integer, Float, DateTime, event, insert, select
+
+from app.db.session import Base
+from app.models.car import Car
+
+
+class PriceHistory(Base):
+    __tablename__ = "price_history"
+    # Append-only: every price change adds a row. The (car_id, effective_from) primary key is the
+    # index both "price at T" and "series over a range" seek on. No foreign key, so history
+    # outlives deleted cars.
+    __table_args__ = {'comment': 'Append-only history of effective car prices'}
+
+    car_id = Column(Integer, primary_key=True)
+    effective_from = Column(DateTime, primary_key=True)
+    price = Column(Float, nullable=False)
+
+    def __repr__(self):
+        return f"<PriceHistory {self.car_id}@{self.effective_from}>"
+
+    def __str__(self):
+        return self.__repr__()
+
+
+def _seed_price_history(target, connection, **kw):
+    # History only grows on price changes, so start every existing car at its current price
+    effective_from = datetime.utcnow()
+    rows = [{"car_id": car_id, "effective_from": effective_from, "price": round(daily_rate * surge_multiplier, 2)}
+            for car_id, daily_rate, surge_multiplier
+            in connection.execute(select(Car.id, Car.daily_rate, Car.surge_multiplier))]
+    if rows:
+        connection.execute(insert(target), rows)
+
+
+event.listen(PriceHistory.__table__, "after_create", _seed_price_history)
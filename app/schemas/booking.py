@@ -1,6 +1,7 @@
 from datetime import datetime
+from typing import List, Literal, Optional
 
-from pydantic import BaseModel, Field, field_validator
+from pydantic import BaseModel, Field, ValidationInfo, field_validator
 
 
 class BookingBase(BaseModel):
@@ -11,14 +12,15 @@ class BookingBase(BaseModel):
     price: float = Field(..., gt=0, description="Price must be greater than zero")
 
     @field_validator("end_time")
-    def end_time_must_be_after_start_time(cls, end_time, values):
-        if "start_time" in values and end_time <= values["start_time"]:
+    def end_time_must_be_after_start_time(cls, end_time, info: ValidationInfo):
+        start_time = info.data.get("start_time")
+        if start_time is not None and end_time <= start_time:
             raise ValueError("end_time must be after start_time")
         return end_time
 
 
 class BookingCreate(BookingBase):
-    pass
+    hold_id: Optional[str] = Field(None, description="Checkout hold this booking redeems")
 
 
 class BookingInDB(BookingBase):
@@ -29,4 +31,33 @@ class BookingInDB(BookingBase):
 
 
 class BookingUpdate(BookingBase):
-    pass
\ No newline at end of file
+    pass
+
+
+class BookingBulkCreate(BaseModel):
+    bookings: List[BookingCreate] = Field(..., min_length=1, max_length=500,
+                                          description="Bookings to create in a single transaction")
+
+
+class BookingBulkItem(BaseModel):
+    index: int = Field(..., description="Position of the booking in the request")
+    status: Literal["created", "conflict"]
+    booking: Optional[BookingInDB] = None
+    detail: Optional[str] = None
+
+
+class BookingBulkResult(BaseModel):
+    created: int
+    items: List[BookingBulkItem]
+
+
+class BookingHoldCreate(BaseModel):
+    car_id: int
+    start_time: datetime
+    end_time: datetime
+
+
+class BookingHold(BookingHoldCreate):
+    id: str
+    user_id: int
+    expires_at: datetime
@@ -1,5 +1,8 @@
 from enum import Enum
 
+from datetime import date
+from typing import Dict, List, Optional
+
 from pydantic import BaseModel, Field
 
 
@@ -25,6 +28,8 @@ class CarBase(BaseModel):
     vehicle_type: VehicleType = Field(..., description="The type of the vehicle")
     location: str = Field(None, description="Location of the vehicle")
     branch_id: int = Field(..., description="Branch ID")
+    latitude: Optional[float] = Field(None, ge=-90, le=90, description="Latitude of the vehicle")
+    longitude: Optional[float] = Field(None, ge=-180, le=180, description="Longitude of the vehicle")
 
 
 class CarCreate(CarBase):
@@ -40,3 +45,15 @@ class CarInDB(CarBase):
 
 class CarUpdate(CarBase):
     pass
+
+
+class CarFacets(BaseModel):
+    vehicle_type: Dict[str, int] = Field(default_factory=dict, description="Car counts per vehicle type")
+    location: Dict[str, int] = Field(default_factory=dict, description="Car counts per location")
+    price_band: Dict[str, int] = Field(default_factory=dict, description="Car counts per daily rate band")
+    total: int = Field(0, description="Total number of matching cars")
+
+
+class CarOccupancy(BaseModel):
+    car_id: int
+    booked_days: List[date] = Field(default_factory=list, description="Days with at least one active booking")
@@ -1,12 +1,20 @@
-from pydantic import BaseModel, Field
+from datetime import datetime
+from typing import List, Optional
+
+from pydantic import BaseModel, Field, model_validator
+
+from app.schemas.car import VehicleType
 
 
 class PricingBase(BaseModel):
     car_id: int
-    surge_price: float = Field(..., gt=0, description="Surge price must be greater than zero")
+    surge_price: float = Field(..., gt=0, description="Surge price must be greater than zero; lasts until the next "
+                                                      "surge recompute")
 
 
 class PricingResponse(PricingBase):
+    surge_multiplier: float = Field(1.0, description="Multiplier applied to the car's daily rate")
+
     class Config:
         from_attributes = True
 
@@ -16,4 +24,47 @@ class PricingCreate(PricingBase):
 
 
 class PricingUpdate(BaseModel):
-    surge_price: float = Field(..., gt=0, description="Surge price must be greater than zero")
+    surge_price: float = Field(..., gt=0, description="Surge price must be greater than zero; lasts until the next "
+                                                      "surge recompute")
+
+
+class Quote(BaseModel):
+    car_id: int
+    days: int = Field(..., description="Number of charged rental days")
+    daily_rate: float = Field(..., description="Current daily rate of the car, including surge")
+    total: float = Field(..., description="Total price, including weekend and seasonal rules")
+
+
+class PricePoint(BaseModel):
+    effective_from: datetime
+    price: float = Field(..., description="Effective daily price from this time on")
+
+
+class PriceAssignment(BaseModel):
+    car_id: int
+    daily_rate: float = Field(..., gt=0, description="New daily rate of the car")
+
+
+class PriceAdjustment(BaseModel):
+    vehicle_type: Optional[VehicleType] = Field(None, description="Only cars of this vehicle type")
+    branch_id: Optional[int] = Field(None, description="Only cars of this branch")
+    location: Optional[str] = Field(None, description="Only cars at this location")
+    percent: float = Field(..., gt=-100, description="Change of the daily rate in percent, e.g. 10 for +10%")
+
+    @model_validator(mode="after")
+    def must_select_cars(self):
+        if self.vehicle_type is None and self.branch_id is None and self.location is None:
+            raise ValueError("An adjustment needs at least one of vehicle_type, branch_id or location")
+        return self
+
+
+class PricingBulkUpdate(BaseModel):
+    prices: Optional[List[PriceAssignment]] = Field(None, min_length=1, max_length=10000,
+                                                    description="Explicit daily rates per car")
+    adjustment: Optional[PriceAdjustment] = Field(None, description="Relative change for every matching car")
+
+    @model_validator(mode="after")
+    def exactly_one_mode(self):
+        if (self.prices is None) == (self.adjustment is None):
+            raise ValueError("Provide either prices or adjustment")
+        return self
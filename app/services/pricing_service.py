@@ -0,0 +1,61 @@
+# app/services/pricing_service.py
+import asyncio
+from typing import Optional
+
+from loguru import logger
+from starlette.concurrency import run_in_threadpool
+
+from app.core.app_settings import settings
+from app.core.redis_config import redis_client
+from app.crud import crud_pricing, crud_price_history
+from app.db.session import SessionLocal
+from app.utils.cache import LOCK_PREFIX
+
+PRICING_JOB_LOCK = f"{LOCK_PREFIX}:pricing_job"
+
+pricing_task: Optional[asyncio.Task] = None
+
+
+def run_pricing_job() -> Optional[int]:
+    """
+    Recompute fleet surge pricing and fully refresh the price snapshot, unless another worker
+    already did so this interval.
+
+    The lock is held for the whole interval rather than released after the run, so with
+    several workers each running the scheduler the job still runs once per interval.
+    """
+    if not redis_client.set(PRICING_JOB_LOCK, 1, nx=True, ex=max(settings.PRICING_JOB_INTERVAL - 1, 1)):
+        return None
+    db = SessionLocal()
+    try:
+        updated = crud_pricing.recompute_surge(db)
+        crud_price_history.refresh_price_snapshot(db)
+        return updated
+    finally:
+        db.close()
+
+
+async def _schedule_pricing() -> None:
+    while True:
+        try:
+            updated = await run_in_threadpool(run_pricing_job)
+            if updated is not None:
+                logger.info(f"Surge pricing recomputed: {updated} cars updated")
+        except Exception as e:
+            logger.error(f"Error recomputing surge pricing: {e}")
+        await asyncio.sleep(settings.PRICING_JOB_INTERVAL)
+
+
+def start_pricing_scheduler() -> None:
+    global pricing_task
+    if pricing_task is None and settings.PRICING_JOB_INTERVAL > 0:
+        pricing_task = asyncio.create_task(_schedule_pricing())
+        logger.info(f"Pricing scheduler started, every {settings.PRICING_JOB_INTERVAL}s.")
+
+
+def stop_pricing_scheduler() -> None:
+    global pricing_task
+    if pricing_task is not None:
+        pricing_task.cancel()
+        pricing_task = None
+        logger.info("Pricing scheduler stopped.")
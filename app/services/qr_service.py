@@ -0,0 +1,103 @@
+# app/services/qr_service.py
+import asyncio
+import hashlib
+from concurrent.futures import ProcessPoolExecutor
+from io import BytesIO
+from typing import List
+
+import qrcode
+from loguru import logger
+
+from app.core.app_settings import settings
+from app.core.redis_config import get_redis
+
+QR_STORE_PREFIX = "qr"
+QR_STORE_TTL = 30 * 24 * 3600
+
+qr_executor = None
+
+
+def booking_qr_data(booking) -> str:
+    return (f"Booking ID: {booking.id}, Car ID: {booking.car_id}, User ID: {booking.user_id}, "
+            f"Start Time: {booking.start_time}, End Time: {booking.end_time}")
+
+
+def render_qr(data: str) -> bytes:
+    qr = qrcode.QRCode(
+        version=1,
+        error_correction=qrcode.constants.ERROR_CORRECT_L,
+        box_size=10,
+        border=4,
+    )
+    qr.add_data(data)
+    qr.make(fit=True)
+
+    img = qr.make_image(fill='black', back_color='white')
+    buffer = BytesIO()
+    img.save(buffer, format="PNG")
+    return buffer.getvalue()
+
+
+def get_qr_executor() -> ProcessPoolExecutor:
+    global qr_executor
+    if qr_executor is None:
+        qr_executor = ProcessPoolExecutor(max_workers=settings.QR_WORKERS)
+    return qr_executor
+
+
+def shutdown_qr_executor() -> None:
+    global qr_executor
+    if qr_executor is not None:
+        qr_executor.shutdown(wait=False, cancel_futures=True)
+        qr_executor = None
+        logger.info("QR executor shut down.")
+
+
+async def render_qr_async(data: str) -> bytes:
+    """Render a QR PNG in the worker process pool so the CPU work never runs on the event loop."""
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(get_qr_executor(), render_qr, data)
+
+
+def qr_digest(data: str) -> str:
+    # Rendering is deterministic, so the digest of the encoded data addresses the PNG too
+    return hashlib.sha256(data.encode()).hexdigest()
+
+
+async def get_qr_png(data: str) -> bytes:
+    """
+    Return the QR PNG for `data` from the content-addressed Redis store, rendering it on a miss.
+
+    Entries are keyed by `qr_digest(data)`, so identical content is stored once and an evicted
+    entry is simply regenerated on the next request.
+    """
+    redis = await get_redis()
+    store_key = f"{QR_STORE_PREFIX}:{qr_digest(data)}"
+    png = await redis.get(store_key)
+    if png is None:
+        png = await render_qr_async(data)
+        await redis.set(store_key, png, ex=QR_STORE_TTL)
+    return png
+
+
+async def prerender_booking_qr(booking_id: int, qr_data: str) -> None:
+    """
+    Background task: render a booking's QR code into the store ahead of its first request.
+
+    Nothing is written back to the booking; the QR endpoint derives the digest from the booking
+    itself, so the store is all that needs warming.
+    """
+    try:
+        await get_qr_png(qr_data)
+        logger.info(f"QR code pre-rendered for booking {booking_id}")
+    except Exception as e:
+        logger.error(f"Error generating QR code for booking {booking_id}: {e}")
+
+
+async def prerender_booking_qrs(qr_data: List[str]) -> None:
+    """Background task: pre-render the QR codes of a whole batch of bookings in one task."""
+    results = await asyncio.gather(*(get_qr_png(data) for data in qr_data), return_exceptions=True)
+    failed = sum(isinstance(result, Exception) for result in results)
+    if failed:
+        logger.error(f"Error generating {failed} of {len(qr_data)} booking QR codes")
+    logger.info(f"QR codes pre-rendered for {len(qr_data) - failed} bookings")
@@ -0,0 +1,146 @@
+# app/utils/async_cache.py
+import asyncio
+import json
+import secrets
+import time
+from typing import Any, Callable, Dict, List
+
+from starlette.concurrency import run_in_threadpool
+
+from app.core.redis_config import get_redis
+from app.utils.cache import local_cache, redis_stats, NAMESPACE_VERSION_PREFIX, INVALIDATION_CHANNEL, LOCK_PREFIX, \
+    should_refresh
+
+
+async def get_cache(key: str):
+    if local_cache is not None:
+        value = local_cache.get(key)
+        if value is not None:
+            return value
+
+    redis = await get_redis()
+    value = await redis.get(key)
+    if value:
+        redis_stats["hits"] += 1
+        value = json.loads(value)
+        if local_cache is not None:
+            local_cache.set(key, value)
+        return value
+    redis_stats["misses"] += 1
+    return None
+
+
+async def mget_cache(keys: List[str]) -> List:
+    """Fetch several keys at once, going to Redis in one MGET for the L1 misses only."""
+    values = [local_cache.get(key) if local_cache is not None else None for key in keys]
+    missing = [index for index, value in enumerate(values) if value is None]
+    if not missing:
+        return values
+
+    redis = await get_redis()
+    fetched = await redis.mget([keys[index] for index in missing])
+    for index, value in zip(missing, fetched):
+        if value:
+            redis_stats["hits"] += 1
+            values[index] = json.loads(value)
+            if local_cache is not None:
+                local_cache.set(keys[index], values[index])
+        else:
+            redis_stats["misses"] += 1
+    return values
+
+
+async def set_cache(key: str, value: dict, expire: int = 3600):
+    redis = await get_redis()
+    await redis.set(key, json.dumps(value), ex=expire)
+    if local_cache is not None:
+        local_cache.set(key, value, expire)
+
+
+async def set_many_cache(mapping: Dict[str, dict], expire: int = 3600):
+    redis = await get_redis()
+    async with redis.pipeline(transaction=False) as pipe:
+        for key, value in mapping.items():
+            pipe.set(key, json.dumps(value), ex=expire)
+        await pipe.execute()
+    if local_cache is not None:
+        for key, value in mapping.items():
+            local_cache.set(key, value, expire)
+
+
+async def delete_cache(key: str):
+    await delete_many_cache([key])
+
+
+async def delete_many_cache(keys: List[str]):
+    redis = await get_redis()
+    async with redis.pipeline(transaction=False) as pipe:
+        pipe.delete(*keys)
+        if local_cache is not None:
+            for key in keys:
+                local_cache.delete(key)
+                pipe.publish(INVALIDATION_CHANNEL, key)
+        await pipe.execute()
+
+
+async def get_namespace_version(namespace: str) -> int:
+    version_key = f"{NAMESPACE_VERSION_PREFIX}:{namespace}"
+    if local_cache is not None:
+        version = local_cache.get(version_key)
+        if version is not None:
+            return version
+
+    redis = await get_redis()
+    version = await redis.get(version_key)
+    version = int(version) if version else 0
+    if local_cache is not None:
+        local_cache.set(version_key, version)
+    return version
+
+
+async def namespaced_key(namespace: str, key: str) -> str:
+    return f"{namespace}:v{await get_namespace_version(namespace)}:{key}"
+
+
+async def invalidate_namespace(namespace: str) -> int:
+    version_key = f"{NAMESPACE_VERSION_PREFIX}:{namespace}"
+    redis = await get_redis()
+    async with redis.pipeline(transaction=False) as pipe:
+        pipe.incr(version_key)
+        if local_cache is not None:
+            local_cache.delete(version_key)
+            pipe.publish(INVALIDATION_CHANNEL, version_key)
+        version, *_ = await pipe.execute()
+    return version
+
+
+async def get_or_compute(key: str, compute: Callable[[], Any], expire: int = 3600, beta: float = 1.0,
+                         lock_timeout: float = 10.0, wait_timeout: float = 2.0):
+    """Async counterpart of `app.utils.cache.get_or_compute`; `compute` runs in the threadpool."""
+    entry = await get_cache(key)
+    if entry is not None and not should_refresh(entry, beta):
+        return entry["value"]
+
+    redis = await get_redis()
+    lock_key, token = f"{LOCK_PREFIX}:{key}", secrets.token_hex(8)
+    if await redis.set(lock_key, token, nx=True, px=int(lock_timeout * 1000)):
+        try:
+            started = time.monotonic()
+            value = await run_in_threadpool(compute)
+            delta = time.monotonic() - started
+            await set_cache(key, {"value": value, "delta": delta, "expires_at": time.time() + expire}, expire)
+            return value
+        finally:
+            if (await redis.get(lock_key)) == token.encode():
+                await redis.delete(lock_key)
+
+    if entry is not None:
+        return entry["value"]
+
+    deadline = time.monotonic() + wait_timeout
+    while time.monotonic() < deadline:
+        await asyncio.sleep(0.05)
+        entry = await get_cache(key)
+        if entry is not None:
+            return entry["value"]
+    return await run_in_threadpool(compute)
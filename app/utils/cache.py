@@ -1,19 +1,215 @@
 # app/utils/cache.py
+import hashlib
 import json
+import math
+import random
+import secrets
+import time
+from datetime import datetime
+from enum import Enum
+from typing import Any, Callable, List
 
+from loguru import logger
+
+from app.core.app_settings import settings
 from app.core.redis_config import redis_client
+from app.utils.local_cache import LocalCache
+
+NAMESPACE_VERSION_PREFIX = "cache_ns"
+INVALIDATION_CHANNEL = "cache_invalidation"
+LOCK_PREFIX = "lock"
+
+# Per-worker L1 tier in front of Redis; None when disabled
+local_cache = LocalCache(settings.LOCAL_CACHE_MAX_ENTRIES, settings.LOCAL_CACHE_TTL) \
+    if settings.LOCAL_CACHE_ENABLED else None
+
+redis_stats = {"hits": 0, "misses": 0}
+invalidation_thread = None
 
 
 def get_cache(key: str):
+    if local_cache is not None:
+        value = local_cache.get(key)
+        if value is not None:
+            return value
+
     value = redis_client.get(key)
     if value:
-        return json.loads(value)
+        redis_stats["hits"] += 1
+        value = json.loads(value)
+        if local_cache is not None:
+            local_cache.set(key, value)
+        return value
+    redis_stats["misses"] += 1
     return None
 
 
 def set_cache(key: str, value: dict, expire: int = 3600):
     redis_client.set(key, json.dumps(value), ex=expire)
+    if local_cache is not None:
+        local_cache.set(key, value, expire)
 
 
 def delete_cache(key: str):
     redis_client.delete(key)
+    evict_local(key)
+
+
+def delete_many_cache(keys: List[str]):
+    with redis_client.pipeline(transaction=False) as pipe:
+        pipe.delete(*keys)
+        if local_cache is not None:
+            for key in keys:
+                local_cache.delete(key)
+                pipe.publish(INVALIDATION_CHANNEL, key)
+        pipe.execute()
+
+
+def evict_local(key: str):
+    """Drop `key` from this worker's L1 and tell every other worker to do the same."""
+    if local_cache is not None:
+        local_cache.delete(key)
+        redis_client.publish(INVALIDATION_CHANNEL, key)
+
+
+def normalize_criteria(criteria: dict) -> dict:
+    """Drop unset (None) criteria and lower-case/strip string values so equivalent searches compare equal."""
+    normalized = {}
+    for key, value in criteria.items():
+        if value is None:
+            continue
+        if isinstance(value, Enum):
+            value = value.value
+        if isinstance(value, str):
+            value = value.strip().lower()
+        normalized[key] = value
+    return normalized
+
+
+def _canonical_value(value):
+    if isinstance(value, bool):
+        return value
+    if isinstance(value, (int, float)):
+        return round(float(value), 6)
+    if isinstance(value, datetime):
+        return value.isoformat()
+    if isinstance(value, (list, tuple)):
+        return [_canonical_value(item) for item in value]
+    return value
+
+
+def canonical_key(prefix: str, criteria: dict) -> str:
+    """
+    Build a stable, fixed-length cache key for a set of search criteria.
+
+    Criteria are normalized, numbers are rendered as floats (so 50 and 50.0 match) and keys
+    are sorted before hashing, so argument order and unset filters never fragment the cache.
+    """
+    normalized = {key: _canonical_value(value) for key, value in normalize_criteria(criteria).items()}
+    payload = json.dumps(normalized, sort_keys=True, separators=(",", ":"), default=str)
+    return f"{prefix}_{hashlib.sha1(payload.encode()).hexdigest()}"
+
+
+def should_refresh(entry: dict, beta: float) -> bool:
+    # Probabilistic early expiration (XFetch): the closer to expiry and the costlier the
+    # recomputation, the likelier one reader refreshes the entry before it actually expires
+    return time.time() - entry["delta"] * beta * math.log(1.0 - random.random()) >= entry["expires_at"]
+
+
+def get_or_compute(key: str, compute: Callable[[], Any], expire: int = 3600, beta: float = 1.0,
+                   lock_timeout: float = 10.0, wait_timeout: float = 2.0):
+    """
+    Return the cached value for `key`, recomputing it with `compute` at most once across workers.
+
+    Only the worker holding the Redis lock for `key` runs `compute`; the others serve the stale
+    value while it refreshes, or poll briefly for the fresh one on a cold miss. Entries are
+    refreshed ahead of expiry with probability rising as expiry approaches.
+    """
+    entry = get_cache(key)
+    if entry is not None and not should_refresh(entry, beta):
+        return entry["value"]
+
+    lock_key, token = f"{LOCK_PREFIX}:{key}", secrets.token_hex(8)
+    if redis_client.set(lock_key, token, nx=True, px=int(lock_timeout * 1000)):
+        try:
+            started = time.monotonic()
+            value = compute()
+            delta = time.monotonic() - started
+            set_cache(key, {"value": value, "delta": delta, "expires_at": time.time() + expire}, expire)
+            return value
+        finally:
+            if redis_client.get(lock_key) == token.encode():
+                redis_client.delete(lock_key)
+
+    if entry is not None:
+        return entry["value"]
+
+    deadline = time.monotonic() + wait_timeout
+    while time.monotonic() < deadline:
+        time.sleep(0.05)
+        entry = get_cache(key)
+        if entry is not None:
+            return entry["value"]
+    return compute()
+
+
+def get_namespace_version(namespace: str) -> int:
+    version_key = f"{NAMESPACE_VERSION_PREFIX}:{namespace}"
+    if local_cache is not None:
+        version = local_cache.get(version_key)
+        if version is not None:
+            return version
+
+    version = redis_client.get(version_key)
+    version = int(version) if version else 0
+    if local_cache is not None:
+        local_cache.set(version_key, version)
+    return version
+
+
+def namespaced_key(namespace: str, key: str) -> str:
+    """
+    Build a cache key scoped to the current version of a namespace.
+
+    Every key built for a namespace embeds its version counter, so bumping the
+    counter with `invalidate_namespace` orphans all existing entries at once.
+    The orphaned entries are never read again and simply expire on their TTL.
+    """
+    return f"{namespace}:v{get_namespace_version(namespace)}:{key}"
+
+
+def invalidate_namespace(namespace: str) -> int:
+    version = redis_client.incr(f"{NAMESPACE_VERSION_PREFIX}:{namespace}")
+    evict_local(f"{NAMESPACE_VERSION_PREFIX}:{namespace}")
+    return version
+
+
+def _handle_invalidation(message: dict):
+    key = message["data"]
+    local_cache.delete(key.decode() if isinstance(key, bytes) else key)
+
+
+def start_invalidation_listener() -> None:
+    """Subscribe this worker's L1 to invalidations published by the other workers."""
+    global invalidation_thread
+    if local_cache is None or invalidation_thread is not None:
+        return
+    pubsub = redis_client.pubsub(ignore_subscribe_messages=True)
+    pubsub.subscribe(**{INVALIDATION_CHANNEL: _handle_invalidation})
+    invalidation_thread = pubsub.run_in_thread(sleep_time=0.01, daemon=True)
+    logger.info("Cache invalidation listener started.")
+
+
+def stop_invalidation_listener() -> None:
+    global invalidation_thread
+    if invalidation_thread is not None:
+        invalidation_thread.stop()
+        invalidation_thread = None
+        logger.info("Cache invalidation listener stopped.")
+
+
+def get_cache_stats() -> dict:
+    return {
+        "l1": local_cache.stats() if local_cache is not None else None,
+        "l2": dict(redis_stats),
+    }
@@ -0,0 +1,84 @@
+# app/utils/geo.py
+import math
+from typing import List, Optional, Tuple
+
+GEOHASH_ALPHABET = "0123456789bcdefghjkmnpqrstuvwxyz"
+GEOHASH_PRECISION = 9
+EARTH_RADIUS_KM = 6371.0
+KM_PER_DEGREE = 111.32
+
+
+def encode_geohash(latitude: float, longitude: float, precision: int = GEOHASH_PRECISION) -> str:
+    lat_range, lon_range = [-90.0, 90.0], [-180.0, 180.0]
+    geohash, bits, bit_count, even = [], 0, 0, True
+    while len(geohash) < precision:
+        value, value_range = (longitude, lon_range) if even else (latitude, lat_range)
+        mid = (value_range[0] + value_range[1]) / 2
+        bits <<= 1
+        if value >= mid:
+            bits |= 1
+            value_range[0] = mid
+        else:
+            value_range[1] = mid
+        even = not even
+        bit_count += 1
+        if bit_count == 5:
+            geohash.append(GEOHASH_ALPHABET[bits])
+            bits, bit_count = 0, 0
+    return "".join(geohash)
+
+
+def cell_size(precision: int) -> Tuple[float, float]:
+    """Return the (latitude, longitude) span in degrees of a geohash cell at `precision`."""
+    bits = 5 * precision
+    return 180.0 / 2 ** (bits // 2), 360.0 / 2 ** ((bits + 1) // 2)
+
+
+def haversine_km(lat1: float, lon1: float, lat2: float, lon2: float) -> float:
+    phi1, phi2 = math.radians(lat1), math.radians(lat2)
+    d_phi, d_lambda = math.radians(lat2 - lat1), math.radians(lon2 - lon1)
+    a = math.sin(d_phi / 2) ** 2 + math.cos(phi1) * math.cos(phi2) * math.sin(d_lambda / 2) ** 2
+    return 2 * EARTH_RADIUS_KM * math.asin(math.sqrt(a))
+
+
+def bounding_box(latitude: float, longitude: float, radius_km: float) -> Tuple[float, float, float, float]:
+    """Return (min_lat, max_lat, min_lon, max_lon) enclosing the circle; longitude is not wrapped."""
+    d_lat = radius_km / KM_PER_DEGREE
+    d_lon = radius_km / (KM_PER_DEGREE * max(math.cos(math.radians(min(abs(latitude) + d_lat, 89.0))), 1e-6))
+    return latitude - d_lat, latitude + d_lat, longitude - d_lon, longitude + d_lon
+
+
+def covering_cells(latitude: float, longitude: float, radius_km: float) -> Optional[List[str]]:
+    """
+    Return the geohash prefixes of the 3x3 block of cells around a point that covers `radius_km`.
+
+    The finest precision whose cells are at least `radius_km` across is used, so the circle never
+    reaches past the neighbouring cells. Returns None when the radius is too large for any precision
+    to help, in which case callers should rely on the bounding box alone.
+    """
+    widest_lat = min(abs(latitude) + radius_km / KM_PER_DEGREE, 89.0)
+    for precision in range(GEOHASH_PRECISION, 0, -1):
+        lat_span, lon_span = cell_size(precision)
+        if (lat_span * KM_PER_DEGREE >= radius_km and
+                lon_span * KM_PER_DEGREE * math.cos(math.radians(widest_lat)) >= radius_km):
+            break
+    else:
+        return None
+
+    cells = set()
+    for d_lat in (-1, 0, 1):
+        for d_lon in (-1, 0, 1):
+            cell_lat = max(-90.0, min(90.0, latitude + d_lat * lat_span))
+            cell_lon = (longitude + d_lon * lon_span + 180.0) % 360.0 - 180.0
+            cells.add(encode_geohash(cell_lat, cell_lon, precision))
+    return sorted(cells)
+
+
+def parse_point(value: str) -> Tuple[float, float]:
+    try:
+        latitude, longitude = (float(part) for part in value.split(","))
+    except ValueError as e:
+        raise ValueError(f"Invalid coordinates: {value}") from e
+    if not (-90.0 <= latitude <= 90.0 and -180.0 <= longitude <= 180.0):
+        raise ValueError(f"Invalid coordinates: {value}")
+    return latitude, longitude
@@ -0,0 +1,56 @@
+# app/utils/pagination.py
+import base64
+import json
+from typing import Optional
+
+from fastapi import HTTPException, Query
+
+NEXT_CURSOR_HEADER = "X-Next-Cursor"
+
+
+def encode_cursor(last_id: int) -> str:
+    payload = json.dumps({"id": last_id}).encode()
+    return base64.urlsafe_b64encode(payload).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str) -> int:
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        last_id = json.loads(base64.urlsafe_b64decode(padded))["id"]
+    except (ValueError, TypeError, KeyError) as e:
+        raise ValueError(f"Invalid cursor: {cursor}") from e
+    if not isinstance(last_id, int):
+        raise ValueError(f"Invalid cursor: {cursor}")
+    return last_id
+
+
+def next_cursor(items: list, limit: int) -> Optional[str]:
+    """Return the cursor for the page after `items`, or None when this was the last page."""
+    if not items or len(items) < limit:
+        return None
+    return encode_cursor(items[-1].id)
+
+
+def paginate(query, id_column, skip: int = 0, limit: int = 10, after_id: Optional[int] = None, rank=None):
+    """
+    Apply keyset pagination when `after_id` is given, otherwise fall back to offset pagination.
+
+    Keyset pages seek straight to `id > after_id` through the primary key index instead of
+    scanning and discarding `skip` rows. An optional `rank` expression orders offset pages by
+    relevance; cursors only encode the id, so keyset pages are always in id order.
+    """
+    if after_id is not None:
+        return query.filter(id_column > after_id).order_by(id_column).limit(limit)
+    if rank is not None:
+        query = query.order_by(rank.desc())
+    return query.order_by(id_column).offset(skip).limit(limit)
+
+
+def get_cursor(cursor: Optional[str] = Query(None, description="Opaque cursor from the X-Next-Cursor header "
+                                                                "of the previous page")) -> Optional[int]:
+    if cursor is None:
+        return None
+    try:
+        return decode_cursor(cursor)
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
@@ -0,0 +1,54 @@
+# app/utils/streaming.py
+import csv
+import io
+import json
+from datetime import datetime
+from enum import Enum
+from typing import BinaryIO, Iterable, Iterator, List, Literal
+
+ExportFormat = Literal["csv", "ndjson"]
+MEDIA_TYPES = {"csv": "text/csv", "ndjson": "application/x-ndjson"}
+
+
+def _plain(value):
+    if isinstance(value, Enum):
+        return value.value
+    if isinstance(value, datetime):
+        return value.isoformat()
+    return value
+
+
+def iter_records(file: BinaryIO, fmt: str) -> Iterator[dict]:
+    """
+    Lazily parse an uploaded CSV or NDJSON file into dicts, one line at a time.
+
+    Empty CSV cells become None so optional fields validate the same way in both formats.
+    """
+    text = io.TextIOWrapper(file, encoding="utf-8", newline="")
+    if fmt == "csv":
+        for row in csv.DictReader(text):
+            yield {key: (value if value != "" else None) for key, value in row.items()}
+    else:
+        for line in text:
+            if line.strip():
+                yield json.loads(line)
+
+
+def encode_rows(rows: Iterable, columns: List[str], fmt: str) -> Iterator[str]:
+    """Serialize row tuples as CSV (with a header line) or NDJSON, yielding one chunk per row."""
+    if fmt == "csv":
+        buffer = io.StringIO()
+        writer = csv.writer(buffer)
+        rows = iter(rows)
+        writer.writerow(columns)
+        while True:
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate()
+            row = next(rows, None)
+            if row is None:
+                return
+            writer.writerow([_plain(value) for value in row])
+    else:
+        for row in rows:
+            yield json.dumps({column: _plain(value) for column, value in zip(columns, row)}) + "\n"
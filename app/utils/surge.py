@@ -0,0 +1,48 @@
+# app/utils/surge.py
+import numpy as np
+
+SECONDS_PER_DAY = 86400
+MIN_SURGE = 0.8
+MAX_SURGE = 2.5
+TARGET_OCCUPANCY = 0.6
+
+# How strongly each demand signal moves the multiplier away from 1.0
+OCCUPANCY_WEIGHT = 0.8
+LEAD_TIME_WEIGHT = 0.3
+VEHICLE_TYPE_WEIGHT = 0.4
+BRANCH_WEIGHT = 0.4
+
+
+def group_mean(values: np.ndarray, groups: np.ndarray) -> np.ndarray:
+    """Mean of `values` within each group, broadcast back to every member of the group."""
+    sums = np.bincount(groups, weights=values)
+    counts = np.bincount(groups)
+    return (sums / np.maximum(counts, 1))[groups]
+
+
+def fleet_demand(car_ids: np.ndarray, booking_car_ids: np.ndarray, starts: np.ndarray, ends: np.ndarray,
+                 now: int, horizon_days: int):
+    """
+    Per-car occupancy and lead time over the next `horizon_days`.
+
+    `car_ids` must be sorted; bookings are given as parallel arrays with times in epoch seconds.
+    Occupancy is the booked fraction of the horizon and lead time the days until the car is
+    next on rent (0 while it is out, the full horizon if it is never booked).
+    """
+    horizon = horizon_days * SECONDS_PER_DAY
+    index = np.searchsorted(car_ids, booking_car_ids)
+    overlap = np.clip(ends, now, now + horizon) - np.clip(starts, now, now + horizon)
+    occupancy = np.minimum(np.bincount(index, weights=overlap, minlength=len(car_ids)) / horizon, 1.0)
+    lead = np.full(len(car_ids), float(horizon))
+    np.minimum.at(lead, index, np.maximum(starts - now, 0).astype(float))
+    return occupancy, lead / SECONDS_PER_DAY
+
+
+def surge_multipliers(occupancy: np.ndarray, lead_days: np.ndarray, type_codes: np.ndarray,
+                      branch_codes: np.ndarray, horizon_days: int) -> np.ndarray:
+    """Surge multiplier per car from its own demand and that of its vehicle type and branch."""
+    pressure = (OCCUPANCY_WEIGHT * (occupancy - TARGET_OCCUPANCY)
+                + LEAD_TIME_WEIGHT * (1 - np.minimum(lead_days, horizon_days) / horizon_days)
+                + VEHICLE_TYPE_WEIGHT * (group_mean(occupancy, type_codes) - TARGET_OCCUPANCY)
+                + BRANCH_WEIGHT * (group_mean(occupancy, branch_codes) - TARGET_OCCUPANCY))
+    return np.round(np.clip(1 + pressure, MIN_SURGE, MAX_SURGE), 2)
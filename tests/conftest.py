@@ -4,6 +4,7 @@ from sqlalchemy.orm import Session
 
 from app.core.rate_limiter import RateLimiter
 from app.core.security import get_password_hash
+from app.crud.crud_user import invalidate_principal
 from app.db.session import engine, Base
 from app.main import app
 from app.models.model_enums import Role
@@ -59,6 +60,7 @@ def test_user(db_session: Session):
     db_session.add(user)
     db_session.commit()
     db_session.refresh(user)
+    invalidate_principal(user.username)  # The user was recreated outside crud_user
     return user
 
 @pytest.fixture
@@ -1,7 +1,16 @@
+import asyncio
 import uuid
 
+from passlib.hash import bcrypt
+from sqlalchemy import event
+
+from app.core.security import get_password_hash, get_password_hash_async, verify_and_update_password, \
+    verify_password
+from app.crud import crud_user
+from app.db.session import engine
 from app.models.user import Role
 from app.models.user import User
+from app.schemas.user import UserUpdate
 
 
 # tests/test_auth.py
@@ -121,3 +130,60 @@ def test_login_with_invalid_credentials(test_client):
     assert response.status_code == 401
     assert "detail" in response.json()
     assert response.json()["detail"] == "Incorrect username or password"
+
+
+def test_verify_and_update_password_upgrades_weak_hash():
+    weak_hash = bcrypt.using(rounds=4).hash("testpassword")
+    valid, new_hash = verify_and_update_password("testpassword", weak_hash)
+    assert valid
+    assert new_hash is not None and new_hash != weak_hash
+
+
+def test_get_password_hash_async():
+    hashed_password = asyncio.run(get_password_hash_async("testpassword"))
+    assert verify_password("testpassword", hashed_password)
+
+
+def _login_new_user(test_client, db_session, role=Role.ADMIN):
+    email = f"principal_{uuid.uuid4().hex[:12]}@example.com"
+    user = User(username=email, email=email, hashed_password=get_password_hash("testpassword"),
+                full_name="Principal Test", phone_number="1234567890", role=role, is_active=True)
+    db_session.add(user)
+    db_session.commit()
+    db_session.refresh(user)
+    response = test_client.post("/api/v1/auth/login", data={"username": email, "password": "testpassword"})
+    assert response.status_code == 200
+    return user, {"Authorization": f"Bearer {response.json()['access_token']}"}
+
+
+def test_cached_principal_authenticates_without_a_query(db_session, test_user):
+    statements = []
+
+    def count_statement(*args):
+        statements.append(args[2])
+
+    assert crud_user.get_principal(db_session, test_user.username).id == test_user.id
+    event.listen(engine, "before_cursor_execute", count_statement)
+    try:
+        principal = crud_user.get_principal(db_session, test_user.username)
+    finally:
+        event.remove(engine, "before_cursor_execute", count_statement)
+    assert principal.id == test_user.id
+    assert statements == []
+
+
+def test_role_change_applies_on_next_request(test_client, db_session):
+    user, headers = _login_new_user(test_client, db_session)
+    assert test_client.get("/api/v1/users/", headers=headers).status_code == 200
+
+    crud_user.update_user(db_session, user.id, UserUpdate(username=user.username, email=user.email, role=Role.USER))
+    assert test_client.get("/api/v1/users/", headers=headers).status_code == 400
+    assert test_client.get("/api/v1/users/me", headers=headers).json()["role"] == Role.USER
+
+
+def test_deleted_user_is_rejected_on_next_request(test_client, db_session):
+    user, headers = _login_new_user(test_client, db_session)
+    assert test_client.get("/api/v1/users/me", headers=headers).status_code == 200
+
+    crud_user.delete_user(db_session, user.id)
+    assert test_client.get("/api/v1/users/me", headers=headers).status_code == 401
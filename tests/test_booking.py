@@ -1,6 +1,30 @@
+import csv
+import io
+import json
+
+import pytest
 from fastapi.testclient import TestClient
+from sqlalchemy.exc import IntegrityError
 from sqlalchemy.orm import Session
 
+from app.crud.crud_booking import BookingConflictError, EXCLUSION_VIOLATION, EXPORT_COLUMNS, _raise_conflict
+
+from app.models.booking import Booking, BookingArchive
+from app.models.car import Car
+from app.models.model_enums import STATUS, VehicleType
+
+
+def _create_car(db_session: Session, model: str = "Booking Test") -> Car:
+    car = Car(model=model, available=True, daily_rate=50.0, vehicle_type=VehicleType.SEDAN,
+              location="Booking Lot", branch_id=1)
+    db_session.add(car)
+    db_session.commit()
+    return car
+
+
+def _booking(car: Car, user, start_time: str, end_time: str) -> dict:
+    return {"car_id": car.id, "user_id": user.id, "start_time": start_time, "end_time": end_time, "price": 50.0}
+
 
 def test_create_booking(test_client: TestClient, db_session: Session, test_booking_data, auth_headers):
     response = test_client.post("/api/v1/bookings/", json=test_booking_data, headers=auth_headers)
@@ -33,3 +57,142 @@ def test_delete_booking(test_client: TestClient, db_session: Session, test_booki
     booking_id = response.json()["id"]
     response = test_client.delete(f"/api/v1/bookings/{booking_id}", headers=auth_headers)
     assert response.status_code == 200
+
+
+def test_archive_bookings(test_client: TestClient, db_session: Session, test_user, auth_headers):
+    car = _create_car(db_session, "Archive Test")
+    booking = _booking(car, test_user, "2023-10-01T10:00:00", "2023-10-01T12:00:00")
+    response = test_client.post("/api/v1/bookings/", json=booking, headers=auth_headers)
+    assert response.status_code == 200
+    booking_id = response.json()["id"]
+
+    response = test_client.post("/api/v1/bookings/archive", params={"before": "2023-10-02T00:00:00"},
+                                headers=auth_headers)
+    assert response.status_code == 200
+    assert response.json()["archived"] >= 1
+    assert db_session.get(Booking, booking_id) is None
+    assert db_session.query(BookingArchive).filter_by(id=booking_id, car_id=car.id).count() == 1
+
+
+def test_export_bookings(test_client: TestClient, db_session: Session, test_user, auth_headers):
+    car = _create_car(db_session, "Export Test")
+    for start_time, end_time in (("2023-12-01T10:00:00", "2023-12-01T12:00:00"),
+                                 ("2023-12-02T10:00:00", "2023-12-02T12:00:00")):
+        response = test_client.post("/api/v1/bookings/", json=_booking(car, test_user, start_time, end_time),
+                                    headers=auth_headers)
+        assert response.status_code == 200
+
+    response = test_client.get("/api/v1/bookings/export", params={"format": "csv", "car_id": car.id},
+                               headers=auth_headers)
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("text/csv")
+    reader = csv.DictReader(io.StringIO(response.text))
+    rows = list(reader)
+    assert reader.fieldnames == EXPORT_COLUMNS
+    assert [row["start_time"] for row in rows] == ["2023-12-01T10:00:00", "2023-12-02T10:00:00"]
+    assert {row["car_id"] for row in rows} == {str(car.id)}
+
+    response = test_client.get("/api/v1/bookings/export", params={"format": "ndjson", "car_id": car.id},
+                               headers=auth_headers)
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("application/x-ndjson")
+    records = [json.loads(line) for line in response.text.splitlines()]
+    assert len(records) == 2
+    assert all(list(record) == EXPORT_COLUMNS for record in records)
+    assert {record["car_id"] for record in records} == {car.id}
+
+
+def test_booking_qr_revalidates_with_etag(test_client: TestClient, db_session: Session, test_user, auth_headers):
+    car = _create_car(db_session)
+    booking = _booking(car, test_user, "2023-11-01T10:00:00", "2023-11-01T12:00:00")
+    booking_id = test_client.post("/api/v1/bookings/", json=booking, headers=auth_headers).json()["id"]
+
+    response = test_client.get(f"/api/v1/bookings/{booking_id}/qr", headers=auth_headers)
+    assert response.status_code == 200
+    assert response.headers["content-type"] == "image/png"
+    assert response.content.startswith(b"\x89PNG")
+    etag = response.headers["etag"]
+
+    response = test_client.get(f"/api/v1/bookings/{booking_id}/qr", headers={**auth_headers, "If-None-Match": etag})
+    assert response.status_code == 304
+    assert response.headers["etag"] == etag
+    assert response.content == b""
+
+
+def test_booking_qr_etag_changes_with_booking(test_client: TestClient, db_session: Session, test_user,
+                                              auth_headers):
+    car = _create_car(db_session)
+    booking = _booking(car, test_user, "2023-11-02T10:00:00", "2023-11-02T12:00:00")
+    booking_id = test_client.post("/api/v1/bookings/", json=booking, headers=auth_headers).json()["id"]
+    etag = test_client.get(f"/api/v1/bookings/{booking_id}/qr", headers=auth_headers).headers["etag"]
+
+    response = test_client.get(f"/api/v1/bookings/{booking_id}/qr",
+                               headers={**auth_headers, "If-None-Match": f'"stale", W/{etag}'})
+    assert response.status_code == 304
+
+    booking["end_time"] = "2023-11-02T15:00:00"
+    assert test_client.put(f"/api/v1/bookings/{booking_id}", json=booking, headers=auth_headers).status_code == 200
+    response = test_client.get(f"/api/v1/bookings/{booking_id}/qr", headers={**auth_headers, "If-None-Match": etag})
+    assert response.status_code == 200
+    assert response.content.startswith(b"\x89PNG")
+    assert response.headers["etag"] != etag
+
+
+def test_overlapping_booking_is_rejected(test_client: TestClient, db_session: Session, test_user, auth_headers):
+    car = _create_car(db_session)
+    booking = _booking(car, test_user, "2023-12-01T10:00:00", "2023-12-01T14:00:00")
+    assert test_client.post("/api/v1/bookings/", json=booking, headers=auth_headers).status_code == 200
+
+    overlapping = _booking(car, test_user, "2023-12-01T12:00:00", "2023-12-01T16:00:00")
+    response = test_client.post("/api/v1/bookings/", json=overlapping, headers=auth_headers)
+    assert response.status_code == 409
+
+
+def test_back_to_back_bookings_are_allowed(test_client: TestClient, db_session: Session, test_user, auth_headers):
+    car = _create_car(db_session)
+    first = _booking(car, test_user, "2023-12-02T10:00:00", "2023-12-02T12:00:00")
+    second = _booking(car, test_user, "2023-12-02T12:00:00", "2023-12-02T14:00:00")
+    assert test_client.post("/api/v1/bookings/", json=first, headers=auth_headers).status_code == 200
+    assert test_client.post("/api/v1/bookings/", json=second, headers=auth_headers).status_code == 200
+
+
+def test_cancelled_booking_frees_its_slot(test_client: TestClient, db_session: Session, test_user, auth_headers):
+    car = _create_car(db_session)
+    booking = _booking(car, test_user, "2023-12-03T10:00:00", "2023-12-03T12:00:00")
+    booking_id = test_client.post("/api/v1/bookings/", json=booking, headers=auth_headers).json()["id"]
+    db_session.query(Booking).filter(Booking.id == booking_id).update({"status": STATUS.CANCELLED.value})
+    db_session.commit()
+
+    assert test_client.post("/api/v1/bookings/", json=booking, headers=auth_headers).status_code == 200
+
+
+def test_update_into_taken_slot_is_rejected(test_client: TestClient, db_session: Session, test_user, auth_headers):
+    car = _create_car(db_session)
+    taken = _booking(car, test_user, "2023-12-04T10:00:00", "2023-12-04T12:00:00")
+    moving = _booking(car, test_user, "2023-12-04T14:00:00", "2023-12-04T16:00:00")
+    assert test_client.post("/api/v1/bookings/", json=taken, headers=auth_headers).status_code == 200
+    booking_id = test_client.post("/api/v1/bookings/", json=moving, headers=auth_headers).json()["id"]
+
+    moving["start_time"] = "2023-12-04T11:00:00"
+    response = test_client.put(f"/api/v1/bookings/{booking_id}", json=moving, headers=auth_headers)
+    assert response.status_code == 409
+    unchanged = test_client.get(f"/api/v1/bookings/{booking_id}", headers=auth_headers).json()
+    assert unchanged["start_time"] == "2023-12-04T14:00:00"
+
+
+class _DriverError(Exception):
+    def __init__(self, pgcode):
+        super().__init__(pgcode)
+        self.pgcode = pgcode
+
+
+def test_exclusion_violation_maps_to_booking_conflict(db_session: Session):
+    error = IntegrityError("INSERT INTO bookings ...", {}, _DriverError(EXCLUSION_VIOLATION))
+    with pytest.raises(BookingConflictError):
+        _raise_conflict(db_session, error, "Car 1 is already booked")
+
+
+def test_other_integrity_errors_are_not_conflicts(db_session: Session):
+    error = IntegrityError("INSERT INTO bookings ...", {}, _DriverError("23503"))
+    with pytest.raises(IntegrityError):
+        _raise_conflict(db_session, error, "Car 1 is already booked")
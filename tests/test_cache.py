@@ -0,0 +1,118 @@
+import asyncio
+import json
+import time
+import uuid
+
+import pytest
+
+from app.core import redis_config
+from app.core.redis_config import redis_client
+from app.utils import async_cache
+from app.utils.cache import canonical_key, get_cache, set_cache, namespaced_key, invalidate_namespace, local_cache
+from app.utils.local_cache import LocalCache
+
+
+def test_local_cache_evicts_least_recently_used():
+    cache = LocalCache(max_entries=2, ttl=60)
+    cache.set("a", 1)
+    cache.set("b", 2)
+    assert cache.get("a") == 1
+    cache.set("c", 3)
+
+    assert cache.get("b") is None
+    assert cache.get("a") == 1
+    assert cache.get("c") == 3
+
+
+def test_local_cache_expires_entries():
+    cache = LocalCache(max_entries=10, ttl=60)
+    cache.set("a", 1, ttl=0)
+    time.sleep(0.01)
+
+    assert cache.get("a") is None
+    assert cache.stats()["size"] == 0
+
+
+def test_local_cache_counts_hits_and_misses():
+    cache = LocalCache(max_entries=10, ttl=60)
+    cache.set("a", 1)
+    cache.get("a")
+    cache.get("missing")
+
+    stats = cache.stats()
+    assert stats["hits"] == 1
+    assert stats["misses"] == 1
+
+
+def test_canonical_key_ignores_order_case_and_unset_criteria():
+    key = canonical_key("search_cars", {"model": "Civic", "max_price": 50, "location": None})
+    assert key == canonical_key("search_cars", {"max_price": 50.0, "model": " civic "})
+    assert key != canonical_key("search_cars", {"model": "civic", "max_price": 60})
+
+
+def test_invalidate_namespace_orphans_existing_entries():
+    namespace = f"test_ns_{uuid.uuid4().hex[:8]}"
+    key = namespaced_key(namespace, "page_1")
+    set_cache(key, {"cars": [1, 2]})
+    assert get_cache(namespaced_key(namespace, "page_1")) == {"cars": [1, 2]}
+
+    version = invalidate_namespace(namespace)
+    fresh_key = namespaced_key(namespace, "page_1")
+    assert version == 1
+    assert fresh_key == f"{namespace}:v1:page_1" != key
+    assert get_cache(fresh_key) is None
+
+
+def _run_with_async_redis(check):
+    # The async client is bound to the loop it was created on, so each test gets its own
+    async def run():
+        previous = redis_config.async_redis
+        await redis_config.init_redis()
+        try:
+            await check(await redis_config.get_redis())
+        finally:
+            await redis_config.close_redis()
+            redis_config.async_redis = previous
+
+    asyncio.run(run())
+
+
+def test_async_get_or_compute_computes_once():
+    key = f"test_async_cache:{uuid.uuid4().hex[:8]}"
+    calls = []
+
+    def compute():
+        calls.append(1)
+        return {"count": len(calls)}
+
+    async def check(redis):
+        assert await async_cache.get_or_compute(key, compute) == {"count": 1}
+        assert await async_cache.get_or_compute(key, compute) == {"count": 1}
+        assert not await redis.exists(f"lock:{key}")
+
+    _run_with_async_redis(check)
+    assert calls == [1]
+
+
+@pytest.mark.skipif(local_cache is None, reason="L1 cache disabled")
+def test_async_mget_cache_fetches_only_l1_misses(monkeypatch):
+    prefix = f"test_async_mget:{uuid.uuid4().hex[:8]}"
+    in_l1, in_redis, missing = f"{prefix}:l1", f"{prefix}:redis", f"{prefix}:missing"
+    redis_client.set(in_redis, json.dumps({"tier": "redis"}))
+    requested = []
+
+    async def check(redis):
+        await async_cache.set_cache(in_l1, {"tier": "l1"})
+        mget = redis.mget
+
+        async def recording_mget(keys):
+            requested.append(list(keys))
+            return await mget(keys)
+
+        monkeypatch.setattr(redis, "mget", recording_mget)
+        values = await async_cache.mget_cache([in_l1, in_redis, missing])
+        assert values == [{"tier": "l1"}, {"tier": "redis"}, None]
+
+    _run_with_async_redis(check)
+    assert requested == [[in_redis, missing]]
+    assert local_cache.get(in_redis) == {"tier": "redis"}
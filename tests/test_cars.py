@@ -0,0 +1,160 @@
+import csv
+import io
+import json
+import uuid
+
+import pytest
+from fastapi.testclient import TestClient
+from sqlalchemy.dialects import sqlite
+from sqlalchemy.orm import Session
+
+from app.crud.crud_car import EXPORT_COLUMNS, _text_match
+from app.models.booking import Booking
+from app.models.car import Car
+from app.models.model_enums import STATUS, VehicleType
+
+
+def _create_cars(db_session: Session, location: str, count: int) -> list:
+    cars = [Car(model="Search Test", daily_rate=50.0, vehicle_type=VehicleType.SEDAN, location=location,
+                branch_id=1) for _ in range(count)]
+    db_session.add_all(cars)
+    db_session.commit()
+    return cars
+
+
+class _SQLiteBind:
+    dialect = sqlite.dialect()
+
+
+class _SQLiteSession:
+    # Only what _text_match looks at, so the fallback filter can run against the test database
+    def get_bind(self):
+        return _SQLiteBind()
+
+
+def _search_ids(test_client: TestClient, auth_headers, **params) -> set:
+    response = test_client.get("/api/v1/cars/", params={"limit": 100, **params}, headers=auth_headers)
+    assert response.status_code == 200
+    return {car["id"] for car in response.json()}
+
+
+def _upload(test_client: TestClient, auth_headers, fmt: str, body: str):
+    return test_client.post("/api/v1/cars/import", params={"format": fmt},
+                            files={"file": (f"cars.{fmt}", body.encode(), "application/octet-stream")},
+                            headers=auth_headers)
+
+
+def test_import_csv_reports_invalid_rows(test_client: TestClient, db_session: Session, auth_headers):
+    model = f"Import {uuid.uuid4().hex[:8]}"
+    body = ("model,daily_rate,vehicle_type,location,branch_id\n"
+            f"{model},45.0,sedan,Import Lot,1\n"
+            f"{model},-5,sedan,Import Lot,1\n"
+            f"{model},60.0,spaceship,Import Lot,1\n"
+            f"{model},70.0,suv,Import Lot,2\n")
+
+    response = _upload(test_client, auth_headers, "csv", body)
+    assert response.status_code == 200
+    result = response.json()
+    assert result["imported"] == 2
+    assert [error["line"] for error in result["errors"]] == [2, 3]
+    assert "daily_rate" in result["errors"][0]["detail"]
+    assert "vehicle_type" in result["errors"][1]["detail"]
+    assert sorted(car.daily_rate for car in db_session.query(Car).filter_by(model=model)) == [45.0, 70.0]
+
+
+def test_import_ndjson_reports_invalid_rows(test_client: TestClient, db_session: Session, auth_headers):
+    model = f"Import {uuid.uuid4().hex[:8]}"
+    lines = [{"model": model, "daily_rate": 45.0, "vehicle_type": "sedan", "branch_id": 1},
+             {"model": model, "vehicle_type": "sedan", "branch_id": 1},
+             {"model": model, "daily_rate": 80.0, "vehicle_type": "van", "branch_id": 1, "latitude": 52.5,
+              "longitude": 13.4}]
+
+    response = _upload(test_client, auth_headers, "ndjson", "\n".join(json.dumps(line) for line in lines))
+    assert response.status_code == 200
+    result = response.json()
+    assert result["imported"] == 2
+    assert [error["line"] for error in result["errors"]] == [2]
+    assert db_session.query(Car).filter_by(model=model).count() == 2
+
+
+def test_import_rejects_malformed_upload(test_client: TestClient, auth_headers):
+    response = _upload(test_client, auth_headers, "ndjson", "{not json")
+    assert response.status_code == 400
+
+
+def test_export_cars(test_client: TestClient, auth_headers):
+    model = f"Export {uuid.uuid4().hex[:8]}"
+    body = "".join(f"{model},{rate},sedan,Export Lot,1\n" for rate in (40.0, 50.0, 60.0))
+    assert _upload(test_client, auth_headers, "csv",
+                   "model,daily_rate,vehicle_type,location,branch_id\n" + body).json()["imported"] == 3
+
+    response = test_client.get("/api/v1/cars/export", params={"format": "csv"}, headers=auth_headers)
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("text/csv")
+    reader = csv.DictReader(io.StringIO(response.text))
+    rows = [row for row in reader if row["model"] == model]
+    assert reader.fieldnames == EXPORT_COLUMNS
+    assert sorted(float(row["daily_rate"]) for row in rows) == [40.0, 50.0, 60.0]
+    assert {row["vehicle_type"] for row in rows} == {"sedan"}
+
+    response = test_client.get("/api/v1/cars/export", params={"format": "ndjson"}, headers=auth_headers)
+    assert response.status_code == 200
+    records = [record for record in map(json.loads, response.text.splitlines()) if record["model"] == model]
+    assert len(records) == 3
+    assert all(list(record) == EXPORT_COLUMNS for record in records)
+
+
+def test_availability_search_excludes_booked_cars(test_client: TestClient, db_session: Session, test_user,
+                                                  auth_headers):
+    location = f"Availability {uuid.uuid4().hex[:8]}"
+    booked, free, cancelled = _create_cars(db_session, location, 3)
+    for car in (booked, cancelled):
+        response = test_client.post("/api/v1/bookings/", json={
+            "car_id": car.id, "user_id": test_user.id, "start_time": "2024-01-10T10:00:00",
+            "end_time": "2024-01-10T12:00:00", "price": 50.0}, headers=auth_headers)
+        assert response.status_code == 200
+        if car is cancelled:
+            db_session.query(Booking).filter(Booking.id == response.json()["id"]) \
+                .update({"status": STATUS.CANCELLED.value})
+            db_session.commit()
+
+    overlapping = {"start_time": "2024-01-10T11:00:00", "end_time": "2024-01-10T13:00:00"}
+    touching = {"start_time": "2024-01-10T12:00:00", "end_time": "2024-01-10T14:00:00"}
+    assert _search_ids(test_client, auth_headers, location=location, **overlapping) == {free.id, cancelled.id}
+    assert _search_ids(test_client, auth_headers, location=location, **touching) == {booked.id, free.id,
+                                                                                      cancelled.id}
+    assert _search_ids(test_client, auth_headers, location=location) == {booked.id, free.id, cancelled.id}
+
+    response = test_client.get("/api/v1/cars/", params={"start_time": "2024-01-10T11:00:00"}, headers=auth_headers)
+    assert response.status_code == 400
+
+
+def test_text_search_ilike_fallback(db_session: Session):
+    token = uuid.uuid4().hex[:8]
+    location = f"Harbor {token}"
+    matching = _create_cars(db_session, location, 2)
+    _create_cars(db_session, f"Elsewhere {uuid.uuid4().hex[:8]}", 1)
+
+    match, rank = _text_match(_SQLiteSession(), Car.location, f"HARBOR {token}")
+    assert rank is None
+    assert {car.id for car in db_session.query(Car).filter(match)} == {car.id for car in matching}
+    match, _ = _text_match(_SQLiteSession(), Car.location, token.upper())
+    assert {car.id for car in db_session.query(Car).filter(match)} == {car.id for car in matching}
+
+
+def test_text_search_matches_substrings(test_client: TestClient, db_session: Session, auth_headers):
+    token = uuid.uuid4().hex[:8]
+    matching = _create_cars(db_session, f"Harbor {token}", 2)
+    _create_cars(db_session, f"Elsewhere {uuid.uuid4().hex[:8]}", 1)
+
+    assert _search_ids(test_client, auth_headers, location=f"harbor {token}") == {car.id for car in matching}
+    assert _search_ids(test_client, auth_headers, location=token.upper()) == {car.id for car in matching}
+
+
+def test_text_search_tolerates_typos_on_postgres(test_client: TestClient, db_session: Session, auth_headers):
+    if db_session.get_bind().dialect.name != "postgresql":
+        pytest.skip("Word-similarity matching needs pg_trgm")
+    token = uuid.uuid4().hex[:8]
+    matching = _create_cars(db_session, f"Lighthouse {token}", 1)
+
+    assert _search_ids(test_client, auth_headers, location=f"lighthose {token}") == {car.id for car in matching}
@@ -0,0 +1,60 @@
+import uuid
+
+from sqlalchemy.orm import Session
+
+from app.core.redis_config import redis_client
+from app.crud import crud_car, crud_facets
+from app.models.car import Car
+from app.schemas.car import CarCreate, CarUpdate
+
+
+def _stored_facets() -> dict:
+    return crud_facets._facet_hashes([redis_client.hgetall(crud_facets._facet_key(name))
+                                      for name in crud_facets.FACET_NAMES])
+
+
+def _car(location: str, daily_rate: float) -> dict:
+    return {"model": "Facet Test", "daily_rate": daily_rate, "vehicle_type": "wagon", "location": location,
+            "branch_id": 1}
+
+
+def test_price_band_boundaries():
+    assert crud_facets.price_band(0) == "0-50"
+    assert crud_facets.price_band(49.99) == "0-50"
+    assert crud_facets.price_band(50) == "50-100"
+    assert crud_facets.price_band(499.99) == "200-500"
+    assert crud_facets.price_band(500) == "500+"
+
+
+def test_facet_deltas_follow_car_writes(db_session: Session):
+    crud_facets.rebuild_facets(db_session)
+    before = _stored_facets()
+    location = f"Facet Lot {uuid.uuid4().hex[:8]}"
+
+    car = crud_car.create_car(db_session, CarCreate(**_car(location, 40.0)))
+    facets = _stored_facets()
+    assert facets["location"][location] == 1
+    assert facets["vehicle_type"]["wagon"] == before["vehicle_type"].get("wagon", 0) + 1
+    assert facets["price_band"]["0-50"] == before["price_band"].get("0-50", 0) + 1
+
+    crud_car.update_car(db_session, car.id, CarUpdate(**_car(location, 150.0)))
+    facets = _stored_facets()
+    assert facets["price_band"].get("0-50", 0) == before["price_band"].get("0-50", 0)
+    assert facets["price_band"]["100-200"] == before["price_band"].get("100-200", 0) + 1
+
+    crud_car.delete_car(db_session, car.id)
+    facets = _stored_facets()
+    assert location not in facets["location"]
+    assert facets["vehicle_type"].get("wagon", 0) == before["vehicle_type"].get("wagon", 0)
+    assert facets["total"] == before["total"]
+
+
+def test_cold_rebuild_matches_database(db_session: Session):
+    redis_client.delete(crud_facets.FACETS_BUILT_KEY,
+                        *(crud_facets._facet_key(name) for name in crud_facets.FACET_NAMES))
+
+    facets = crud_facets.rebuild_facets(db_session)
+    assert redis_client.exists(crud_facets.FACETS_BUILT_KEY)
+    assert redis_client.ttl(crud_facets.FACETS_BUILT_KEY) > 0
+    assert facets["total"] == db_session.query(Car).count()
+    assert _stored_facets() == facets
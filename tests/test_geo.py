@@ -0,0 +1,83 @@
+from fastapi.testclient import TestClient
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+
+from app.crud import crud_car
+from app.db.session import engine
+from app.models.car import Car
+from app.schemas.car import CarCreate
+from app.utils.geo import encode_geohash, covering_cells, haversine_km
+from app.utils.pagination import encode_cursor
+
+
+def test_encode_geohash():
+    assert encode_geohash(57.64911, 10.40744, 11) == "u4pruydqqvj"
+
+
+def test_covering_cells_contain_nearby_points():
+    cells = covering_cells(40.7128, -74.0060, 5)
+    nearby = encode_geohash(40.7400, -74.0300)
+    assert any(nearby.startswith(cell) for cell in cells)
+
+
+def test_haversine_km():
+    assert round(haversine_km(40.7128, -74.0060, 34.0522, -118.2437)) == 3936
+
+
+# Remote points with no other cars around, so only the cars each test creates are in range
+ORIGIN = (-48.8767, -123.3933)
+CAP_ORIGIN = (-48.8767, -122.3933)
+SEARCH_URL = "/api/v1/cars/"
+
+
+def _create_cars_near(db_session: Session, origin: tuple, *lat_offsets: float) -> list:
+    return [crud_car.create_car(db_session, CarCreate(
+        model="Geo Test", daily_rate=50.0, vehicle_type="sedan", location="Geo Lot", branch_id=1,
+        latitude=origin[0] + offset, longitude=origin[1])) for offset in lat_offsets]
+
+
+def _near(radius: float = 10, **params) -> dict:
+    return {"near": f"{ORIGIN[0]},{ORIGIN[1]}", "radius": radius, **params}
+
+
+def test_near_search_orders_by_distance_within_radius(test_client: TestClient, db_session: Session, auth_headers):
+    far, nearest, middle, outside = _create_cars_near(db_session, ORIGIN, 0.03, 0.01, 0.02, 0.2)
+
+    response = test_client.get(SEARCH_URL, params=_near(), headers=auth_headers)
+    assert response.status_code == 200
+    assert [car["id"] for car in response.json()] == [nearest.id, middle.id, far.id]
+
+    response = test_client.get(SEARCH_URL, params=_near(radius=2), headers=auth_headers)
+    assert [car["id"] for car in response.json()] == [nearest.id]
+
+    response = test_client.get(SEARCH_URL, params=_near(skip=1, limit=1), headers=auth_headers)
+    assert [car["id"] for car in response.json()] == [middle.id]
+
+
+def test_near_search_caps_candidates_read_from_database(db_session: Session):
+    _create_cars_near(db_session, CAP_ORIGIN, 0.05, 0.04, 0.06, 0.07, 0.08)
+    limits = []
+
+    def capture(conn, cursor, statement, parameters, context, executemany):
+        if "LIMIT" in statement.upper() and isinstance(parameters, dict):
+            limits.extend(value for value in parameters.values() if isinstance(value, int))
+
+    event.listen(engine, "before_cursor_execute", capture)
+    try:
+        cars = crud_car._query_nearest(db_session.query(Car), CAP_ORIGIN, 10, skip=1, limit=2)
+    finally:
+        event.remove(engine, "before_cursor_execute", capture)
+    assert len(cars) == 2
+    assert crud_car.NEAR_CANDIDATE_FACTOR * 3 in limits
+
+
+def test_near_search_rejects_cursor_and_oversized_pages(test_client: TestClient, auth_headers):
+    response = test_client.get(SEARCH_URL, params=_near(cursor=encode_cursor(1)), headers=auth_headers)
+    assert response.status_code == 400
+
+    response = test_client.get(SEARCH_URL, params=_near(skip=crud_car.MAX_NEAR_RESULTS, limit=1),
+                               headers=auth_headers)
+    assert response.status_code == 400
+
+    response = test_client.get(SEARCH_URL, params={"near": "91,0"}, headers=auth_headers)
+    assert response.status_code == 400
@@ -0,0 +1,35 @@
+from datetime import datetime, timezone
+
+import pytest
+
+from app.crud.crud_hold import HoldConflictError, InvalidHoldError, check_holds
+
+
+def _holds():
+    return [{"id": "1-abc", "car_id": 1, "user_id": 7, "expires_at": 0,
+             "start": datetime(2024, 5, 1, tzinfo=timezone.utc).timestamp(),
+             "end": datetime(2024, 5, 5, tzinfo=timezone.utc).timestamp()}]
+
+
+def test_check_holds_redeems_own_hold():
+    holds = _holds()
+    assert check_holds(holds, 7, datetime(2024, 5, 2), datetime(2024, 5, 4), "1-abc") is holds[0]
+
+
+def test_check_holds_rejects_overlap_with_another_hold():
+    with pytest.raises(HoldConflictError):
+        check_holds(_holds(), 8, datetime(2024, 5, 4), datetime(2024, 5, 6))
+
+
+def test_check_holds_rejects_hold_not_covering_booking():
+    with pytest.raises(InvalidHoldError):
+        check_holds(_holds(), 7, datetime(2024, 5, 2), datetime(2024, 5, 6), "1-abc")
+
+
+def test_check_holds_allows_free_period():
+    assert check_holds(_holds(), 8, datetime(2024, 5, 5), datetime(2024, 5, 6)) is None
+
+
+def test_check_holds_rejects_redeeming_another_users_hold():
+    with pytest.raises(InvalidHoldError):
+        check_holds(_holds(), 8, datetime(2024, 5, 2), datetime(2024, 5, 4), "1-abc")
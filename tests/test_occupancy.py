@@ -0,0 +1,11 @@
+from datetime import date, datetime
+
+from app.crud.crud_occupancy import day_span
+
+
+def test_day_span_covers_every_day_touched():
+    assert day_span(datetime(2024, 5, 1, 10), datetime(2024, 5, 3, 9)) == (date(2024, 5, 1), date(2024, 5, 3))
+
+
+def test_day_span_excludes_day_a_booking_ends_on_at_midnight():
+    assert day_span(datetime(2024, 5, 1, 10), datetime(2024, 5, 3)) == (date(2024, 5, 1), date(2024, 5, 2))
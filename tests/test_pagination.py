@@ -0,0 +1,22 @@
+import pytest
+
+from app.utils.pagination import encode_cursor, decode_cursor, next_cursor
+
+
+class Row:
+    def __init__(self, id):
+        self.id = id
+
+
+def test_cursor_round_trip():
+    assert decode_cursor(encode_cursor(42)) == 42
+
+
+def test_decode_cursor_rejects_garbage():
+    with pytest.raises(ValueError):
+        decode_cursor("not-a-cursor")
+
+
+def test_next_cursor_only_on_full_pages():
+    assert next_cursor([Row(1), Row(2)], limit=3) is None
+    assert decode_cursor(next_cursor([Row(1), Row(2), Row(3)], limit=3)) == 3
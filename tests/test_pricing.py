@@ -0,0 +1,116 @@
+import json
+import uuid
+from datetime import date, datetime, timedelta
+
+from fastapi.testclient import TestClient
+from sqlalchemy.orm import Session
+
+from app.core.redis_config import redis_client
+from app.crud import crud_price_history
+from app.crud.crud_price_history import drop_prices, price_at, publish_prices, record_prices, refresh_price_snapshot
+from app.crud.crud_pricing import WEEKEND_MULTIPLIER, day_multiplier, rental_days
+from app.models.car import Car
+from app.models.model_enums import VehicleType
+
+BULK_URL = "/api/v1/pricing/pricing/bulk"
+
+
+def _create_cars(db_session: Session, location: str, *daily_rates: float) -> list:
+    cars = [Car(model="Bulk Pricing Test", daily_rate=daily_rate, vehicle_type=VehicleType.SEDAN,
+                location=location, branch_id=1) for daily_rate in daily_rates]
+    db_session.add_all(cars)
+    db_session.commit()
+    return cars
+
+
+def _daily_rates(db_session: Session, cars: list) -> list:
+    db_session.expire_all()
+    return [db_session.get(Car, car.id).daily_rate for car in cars]
+
+
+def test_rental_days_charges_each_started_day():
+    days = rental_days(datetime(2024, 3, 1, 10), datetime(2024, 3, 3, 11))
+    assert days == [date(2024, 3, 1), date(2024, 3, 2), date(2024, 3, 3)]
+
+
+def test_day_multiplier_applies_weekend_rule():
+    assert day_multiplier(date(2024, 3, 6)) == 1.0
+    assert day_multiplier(date(2024, 3, 9)) == WEEKEND_MULTIPLIER
+
+
+def test_bulk_update_sets_explicit_prices(test_client: TestClient, db_session: Session, auth_headers):
+    cars = _create_cars(db_session, f"Bulk Lot {uuid.uuid4().hex[:8]}", 50.0, 80.0, 120.0)
+    prices = [{"car_id": cars[0].id, "daily_rate": 55.0}, {"car_id": cars[1].id, "daily_rate": 95.5}]
+
+    response = test_client.post(BULK_URL, json={"prices": prices}, headers=auth_headers)
+    assert response.status_code == 200
+    assert response.json() == {"updated": 2}
+    assert _daily_rates(db_session, cars) == [55.0, 95.5, 120.0]
+
+
+def test_bulk_update_ignores_unknown_cars(test_client: TestClient, db_session: Session, auth_headers):
+    cars = _create_cars(db_session, f"Bulk Lot {uuid.uuid4().hex[:8]}", 60.0)
+    prices = [{"car_id": cars[0].id, "daily_rate": 70.0}, {"car_id": 999999999, "daily_rate": 10.0}]
+
+    response = test_client.post(BULK_URL, json={"prices": prices}, headers=auth_headers)
+    assert response.status_code == 200
+    assert response.json() == {"updated": 1}
+    assert _daily_rates(db_session, cars) == [70.0]
+
+
+def test_bulk_update_adjusts_matching_cars(test_client: TestClient, db_session: Session, auth_headers):
+    location = f"Bulk Lot {uuid.uuid4().hex[:8]}"
+    cars = _create_cars(db_session, location, 100.0, 40.0)
+    others = _create_cars(db_session, f"Bulk Lot {uuid.uuid4().hex[:8]}", 100.0)
+
+    response = test_client.post(BULK_URL, json={"adjustment": {"location": location, "percent": 10}},
+                                headers=auth_headers)
+    assert response.status_code == 200
+    assert response.json() == {"updated": 2}
+    assert [round(rate, 2) for rate in _daily_rates(db_session, cars)] == [110.0, 44.0]
+    assert _daily_rates(db_session, others) == [100.0]
+
+
+def test_price_at_follows_history(db_session: Session):
+    car = _create_cars(db_session, f"History Lot {uuid.uuid4().hex[:8]}", 50.0)[0]
+    first, change = datetime(2024, 3, 1, 12), datetime(2024, 4, 1, 12)
+    record_prices(db_session, [(car.id, 50.0)], first)
+    record_prices(db_session, [(car.id, 65.0)], change)
+    db_session.commit()
+
+    assert price_at(db_session, car.id, first - timedelta(seconds=1)) is None
+    assert price_at(db_session, car.id, change - timedelta(seconds=1)) == {"effective_from": first, "price": 50.0}
+    assert price_at(db_session, car.id, change) == {"effective_from": change, "price": 65.0}
+    assert price_at(db_session, car.id, change + timedelta(days=30)) == {"effective_from": change, "price": 65.0}
+
+
+def test_snapshot_rebuild_replays_writes_made_while_reading(db_session: Session, monkeypatch):
+    cars = _create_cars(db_session, f"Snapshot Lot {uuid.uuid4().hex[:8]}", 50.0, 60.0)
+    execute = db_session.execute
+
+    def execute_then_write(*args, **kwargs):
+        result = execute(*args, **kwargs)
+        # The rebuild has read the old rates; these writes land before its swap
+        publish_prices([(cars[0].id, 75.0, 1.0)])
+        drop_prices([cars[1].id])
+        assert 0 < redis_client.pttl(crud_price_history.PRICE_JOURNAL_KEY) <= \
+            crud_price_history.SNAPSHOT_REBUILD_TIMEOUT_MS
+        return result
+
+    monkeypatch.setattr(db_session, "execute", execute_then_write)
+    assert refresh_price_snapshot(db_session) >= 2
+
+    snapshot = redis_client.hgetall(crud_price_history.PRICE_SNAPSHOT_KEY)
+    assert json.loads(snapshot[str(cars[0].id).encode()])["surge_price"] == 75.0
+    assert str(cars[1].id).encode() not in snapshot
+    assert redis_client.ttl(crud_price_history.PRICE_SNAPSHOT_KEY) == -1
+    assert not redis_client.exists(crud_price_history.PRICE_BUILDING_KEY, crud_price_history.PRICE_JOURNAL_KEY,
+                                   crud_price_history.PRICE_REBUILD_LOCK)
+
+
+def test_snapshot_rebuild_leaves_a_running_rebuild_alone(db_session: Session):
+    redis_client.set(crud_price_history.PRICE_REBUILD_LOCK, "other-worker", px=1000)
+    try:
+        assert refresh_price_snapshot(db_session) is None
+    finally:
+        redis_client.delete(crud_price_history.PRICE_REBUILD_LOCK)
@@ -0,0 +1,25 @@
+import numpy as np
+
+from app.utils.surge import MAX_SURGE, MIN_SURGE, fleet_demand, group_mean, surge_multipliers
+
+DAY = 86400
+
+
+def test_group_mean_broadcasts_to_members():
+    means = group_mean(np.array([1.0, 3.0, 10.0]), np.array([0, 0, 1]))
+    assert means.tolist() == [2.0, 2.0, 10.0]
+
+
+def test_fleet_demand_clips_bookings_to_horizon():
+    car_ids = np.array([1, 2, 3])
+    occupancy, lead_days = fleet_demand(car_ids, np.array([1, 2]), np.array([-DAY, 2 * DAY]),
+                                        np.array([5 * DAY, 3 * DAY]), now=0, horizon_days=10)
+    assert np.allclose(occupancy, [0.5, 0.1, 0.0])
+    assert np.allclose(lead_days, [0, 2, 10])
+
+
+def test_surge_multipliers_rise_with_demand_and_stay_in_bounds():
+    multipliers = surge_multipliers(np.array([1.0, 0.0]), np.array([0.0, 30.0]), np.array([0, 1]),
+                                    np.array([0, 1]), horizon_days=30)
+    assert multipliers[0] > 1 > multipliers[1]
+    assert MIN_SURGE <= multipliers.min() and multipliers.max() <= MAX_SURGE